@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+
+from mpeg2ts.crc import CRC32, CRC32_bitwise, CRC32_table, CRC32_slice8
+
+def measure(name, method, sections):
+  begin = time.perf_counter()
+  for section in sections:
+    if method(section) != 0: raise Exception('{}: CRC mismatch'.format(name))
+  elapsed = time.perf_counter() - begin
+  size = sum(len(section) for section in sections)
+  print('{:>8s}: {:>6d} sections, {:8.3f} s, {:10.0f} sections/s, {:8.2f} MB/s'.format(name, len(sections), elapsed, len(sections) / elapsed, size / elapsed / 1000000))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('mpeg2ts CRC32 benchmark'))
+
+  parser.add_argument('-n', '--count', type=int, default=200)
+  parser.add_argument('-l', '--length', type=int, default=1024)
+
+  args = parser.parse_args()
+
+  sections = []
+  for _ in range(args.count):
+    payload = os.urandom(args.length - 4)
+    sections.append(payload + CRC32(payload).to_bytes(4, byteorder='big'))
+
+  measure('bitwise', CRC32_bitwise, sections)
+  measure('table', CRC32_table, sections)
+  measure('slice8', CRC32_slice8, sections)
+  measure('zlib', CRC32, sections)
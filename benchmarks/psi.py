@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+from mpeg2ts.section import Section
+from mpeg2ts.crc import CRC32
+from mpeg2ts.psi import PMT
+
+def synthesize(streams):
+  payload  = bytes([0x02, 0xB0, 0x00, 0x04, 0x00, 0xC1, 0x00, 0x00])
+  payload += bytes([0xE1, 0x00, 0xF0, 0x00])
+  for index in range(streams):
+    elementary_PID = 0x0110 + index
+    payload += bytes([0x06, 0xE0 | (elementary_PID >> 8), elementary_PID & 0xFF, 0xF0, 0x03])
+    payload += bytes([0x52, 0x01, 0x30 + index])
+  section = Section(payload)
+  section_length = len(section) + Section.CRC_SIZE - 3
+  section[1] = (section[1] & 0xF0) | ((section_length & 0x0F00) >> 8)
+  section[2] = (section_length & 0xFF)
+  section += CRC32(section.payload).to_bytes(Section.CRC_SIZE, byteorder="big")
+  return section
+
+def legacy(PMT):
+  pids = []
+  program_info_length = ((PMT[Section.HEADER_SIZE + 2] & 0x0F) << 8) | PMT[Section.HEADER_SIZE + 3]
+  begin = Section.HEADER_SIZE + 4 + program_info_length
+  while begin < 3 + PMT.section_length() - Section.CRC_SIZE:
+    stream_type = PMT[begin + 0]
+    elementary_PID = ((PMT[begin + 1] & 0x1F) << 8) | PMT[begin + 2]
+    ES_info_length = ((PMT[begin + 3] & 0x0F) << 8) | PMT[begin + 4]
+
+    descriptor = begin + 5
+    while descriptor < (begin + 5 + ES_info_length):
+      descriptor_tag = PMT[descriptor + 0]
+      descriptor_length = PMT[descriptor + 1]
+      if descriptor_tag == 0x52 and stream_type == 0x06 and PMT[descriptor + 2] == 0x30:
+        pids.append(elementary_PID)
+      descriptor += 2 + descriptor_length
+
+    begin += 5 + ES_info_length
+  return pids
+
+def table(section):
+  section.table = None
+  return [stream.elementary_PID() for stream in PMT.of(section).streams() if stream.stream_type() == 0x06 and stream.component_tag() == 0x30]
+
+def memoized(section):
+  return [stream.elementary_PID() for stream in PMT.of(section).streams() if stream.stream_type() == 0x06 and stream.component_tag() == 0x30]
+
+def measure(name, method, section, count):
+  begin = time.perf_counter()
+  for _ in range(count):
+    if method(section) != [0x0110]: raise Exception('{}: result mismatch'.format(name))
+  elapsed = time.perf_counter() - begin
+  print('{:>8s}: {:>6d} sections, {:8.3f} s, {:10.0f} sections/s'.format(name, count, elapsed, count / elapsed))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('mpeg2ts PSI table benchmark'))
+
+  parser.add_argument('-n', '--count', type=int, default=20000)
+  parser.add_argument('-e', '--streams', type=int, default=8)
+
+  args = parser.parse_args()
+
+  section = synthesize(args.streams)
+  measure('legacy', legacy, section, args.count)
+  measure('table', table, section, args.count)
+  measure('memoized', memoized, section, args.count)
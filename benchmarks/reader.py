@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+
+from mpeg2ts.packet import Packet
+from mpeg2ts.reader import Reader
+
+def synthesize(count):
+  stream = bytearray()
+  for index in range(count):
+    pid = index % 0x20
+    header = bytes([0x47, (pid >> 8) & 0x1F, pid & 0xFF, 0x10 | (index & 0x0F)])
+    stream += header + Packet.STUFFING_BYTE * (Packet.PACKET_SIZE - Packet.HEADER_SIZE)
+  return bytes(stream)
+
+def legacy(input):
+  count = 0
+  while True:
+    sync_byte = input.read(1)
+    if not sync_byte: return count
+    if sync_byte != Packet.SYNC_BYTE: continue
+
+    packet = Packet.SYNC_BYTE + input.read(Packet.PACKET_SIZE - 1)
+    ts = Packet(packet)
+    ts.pid()
+    count += 1
+
+def reader(input):
+  count = 0
+  for ts in Reader(input):
+    ts.pid()
+    count += 1
+  return count
+
+def mapped(input):
+  count = 0
+  for ts in Reader(input, mmap = True):
+    ts.pid()
+    count += 1
+  return count
+
+def measure(name, method, data):
+  begin = time.perf_counter()
+  count = method(io.BufferedReader(io.BytesIO(data)))
+  elapsed = time.perf_counter() - begin
+  print('{:>8s}: {:>9d} packets, {:8.3f} s, {:12.0f} packets/s'.format(name, count, elapsed, count / elapsed))
+
+def measure_file(name, method, data):
+  # mmap はファイルでないと使えないので、一時ファイルに書き出してから計測する
+  with tempfile.TemporaryFile() as file:
+    file.write(data)
+    file.seek(0)
+    begin = time.perf_counter()
+    count = method(file)
+    elapsed = time.perf_counter() - begin
+  print('{:>8s}: {:>9d} packets, {:8.3f} s, {:12.0f} packets/s'.format(name, count, elapsed, count / elapsed))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('mpeg2ts reader benchmark'))
+
+  parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?')
+  parser.add_argument('-n', '--count', type=int, default=200000)
+
+  args = parser.parse_args()
+  data = args.input.read() if args.input else synthesize(args.count)
+
+  measure('legacy', legacy, data)
+  measure('reader', reader, data)
+  measure_file('file', reader, data)
+  measure_file('mmap', mapped, data)
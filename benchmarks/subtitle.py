@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+from mpeg2ts.pes import PES
+from subtitle.JIS8 import JIS8
+from subtitle import dictionary
+from subtitle.render import Renderer
+from subtitle.cache import FontCache, GlyphCache
+
+def synthesize(text):
+  # 漢字は G0 (GL), ひらがなは G2 (GR) の初期状態のまま書く
+  data = bytes([JIS8.APS, 0x40 | 8, 0x40 | 4])
+  for character in text:
+    GR = character.encode('euc_jp')
+    if 'ぁ' <= character <= 'ん':
+      data += GR[1:]
+    else:
+      data += bytes([GR[0] & 0x7F, GR[1] & 0x7F])
+
+  data_unit = bytes([0x1F, 0x20, (len(data) >> 16) & 0xFF, (len(data) >> 8) & 0xFF, len(data) & 0xFF]) + data
+  caption = bytes([0x00, (len(data_unit) >> 16) & 0xFF, (len(data_unit) >> 8) & 0xFF, len(data_unit) & 0xFF]) + data_unit
+  data_group = bytes([0x01 << 2, 0x00, 0x00, (len(caption) >> 8) & 0xFF, len(caption) & 0xFF]) + caption + bytes([0x00, 0x00])
+
+  header = bytes([0x80, 0x80, 0x05, 0x21, 0x00, 0x01, 0x00, 0x01])
+  body = header + bytes([0x80, 0xFF, 0xF0]) + data_group
+  return PES(bytes([0x00, 0x00, 0x01, 0xBD, (len(body) >> 8) & 0xFF, len(body) & 0xFF]) + body)
+
+def rebuild(pes, fonts, glyphs):
+  # 従来と同じく字幕毎に文字集合の表を作り直す
+  dictionary.TABLES.clear()
+  return shared(pes, fonts, glyphs)
+
+def shared(pes, fonts, glyphs):
+  renderer = Renderer(pes, fonts, glyphs)
+  renderer.render()
+  return renderer
+
+def measure(name, method, pes, fonts, glyphs, count):
+  begin = time.perf_counter()
+  for _ in range(count):
+    if not method(pes, fonts, glyphs).fgImage: raise Exception('{}: nothing rendered'.format(name))
+  elapsed = time.perf_counter() - begin
+  print('{:>8s}: {:>6d} captions, {:8.3f} s, {:10.1f} captions/s'.format(name, count, elapsed, count / elapsed))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('ARIB subtitle renderer benchmark'))
+
+  parser.add_argument('-n', '--count', type=int, default=100)
+  parser.add_argument('-t', '--text', type=str, default='字幕のテストです')
+  parser.add_argument('--font', type=str, default=FontCache.PATH)
+
+  args = parser.parse_args()
+
+  pes = synthesize(args.text)
+  # 大きさ 0 のキャッシュは毎回作り直すのと同じ (文字毎にフォントを開き、文字を描く)
+  measure('rebuild', rebuild, pes, FontCache(args.font, 0), GlyphCache(0), args.count)
+  measure('tables', shared, pes, FontCache(args.font, 0), GlyphCache(0), args.count)
+  measure('fonts', shared, pes, FontCache(args.font), GlyphCache(0), args.count)
+  glyphs = GlyphCache()
+  measure('glyphs', shared, pes, FontCache(args.font), glyphs, args.count)
+  print('{:>8s}: {:>6d} hits, {:>6d} misses, {:>6d} entries'.format('glyphs', glyphs.hits, glyphs.misses, len(glyphs)))
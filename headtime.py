@@ -3,87 +3,101 @@
 import argparse
 import sys
 from pathlib import Path
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta, timezone
 
 from PIL import Image
 
 from mpeg2ts.packet import Packet
+from mpeg2ts.reader import Reader
+from mpeg2ts.index import Index
 from mpeg2ts.section import Section
 from mpeg2ts.parser import SectionParser, PESParser
-from mpeg2ts.mjd import BCD, MJD_to_YMD
+from mpeg2ts.demuxer import Demuxer
+from mpeg2ts.cache import SectionCache
+from mpeg2ts.psi import PAT as PAT_Table, PMT as PMT_Table, TOT as TOT_Table
+from mpeg2ts.timeline import Timeline
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description=('output head time'))
 
   parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?', default=sys.stdin.buffer)
   parser.add_argument('-s', '--SID', type=int, nargs='?')
+  parser.add_argument('--prefetch', type=int, default=0)
+  parser.add_argument('--mmap', action='store_true')
+  parser.add_argument('--index', type=Path, nargs='?')
 
   args = parser.parse_args()
 
-  PAT_Parser = SectionParser()
-  PMT_Parser = SectionParser()
-  TOT_Parser = SectionParser()
+  demuxer = Demuxer()
 
   PMT_PID = -1
   PCR_PID = -1
 
-  FIRST_PCR = None
   FIRST_TOT = None
-  FIRST_TOT_PCR = None
-
-  while args.input:
-    while True:
-      sync_byte = args.input.read(1)
-      if not sync_byte: sys.exit()
-      if sync_byte == Packet.SYNC_BYTE: break
-
-    packet = Packet.SYNC_BYTE + args.input.read(Packet.PACKET_SIZE - 1)
-    ts = Packet(packet)
-
-    if ts.pid() == 0x00:
-      PAT_Parser.push(ts)
-      while not PAT_Parser.empty():
-        PAT = PAT_Parser.pop()
-        if PAT.CRC32() != 0: continue
-
-        begin = Section.HEADER_SIZE
-        while begin < 3 + PAT.section_length() - Section.CRC_SIZE:
-          program_number = (PAT[begin + 0] << 8) | PAT[begin + 1]
-          program_map_PID = ((PAT[begin + 2] & 0x1F) << 8) | PAT[begin + 3]
-
-          if program_number == args.SID:
-            PMT_PID = program_map_PID
-
-          begin += 4
-    elif ts.pid() == PMT_PID:
-      PMT_Parser.push(ts)
-      while not PMT_Parser.empty():
-        PMT = PMT_Parser.pop()
-        if PMT.CRC32() != 0: continue
-
-        PCR_PID = ((PMT[Section.HEADER_SIZE + 0] & 0x1F) << 8) | PMT[Section.HEADER_SIZE + 1]
-    elif ts.pid() == PCR_PID:
-      if ts.pcr() is None:
-        pass
-      elif not FIRST_PCR:
-        FIRST_PCR = ts.pcr()
-      elif FIRST_TOT:
-        FIRST_TOT_PCR = ts.pcr()
-        delta = timedelta(seconds = (((FIRST_TOT_PCR - FIRST_PCR + 2 ** 33) % (2 ** 33)) / 90000))
-        HEAD = FIRST_TOT - delta
-        print(HEAD.astimezone(timezone(timedelta(hours=9))))
-        break
-    elif ts.pid() == 0x14:
-      TOT_Parser.push(ts)
-      while not TOT_Parser.empty():
-        TOT = TOT_Parser.pop()
-        if TOT.CRC32() != 0: continue
-        if FIRST_TOT: continue
-
-        MJD = (TOT[3 + 0] << 8) + TOT[3 + 1]
-        year, month, day = MJD_to_YMD(MJD)
-        hour = BCD(TOT[3 + 2])
-        min = BCD(TOT[3 + 3])
-        sec = BCD(TOT[3 + 4])
-
-        FIRST_TOT = datetime(year, month, day, hour, min, sec)
+  HEAD = None
+
+  timeline = Timeline()
+
+  def PAT_handler(PAT):
+    global PMT_PID
+    if not PAT.valid(): return
+    if PAT.unchanged: return
+
+    program_map_PID = PAT_Table.of(PAT).program_map_PID(args.SID)
+    if program_map_PID is not None and program_map_PID != PMT_PID:
+      demuxer.unsubscribe(PMT_PID, PMT_Parser.push)
+      PMT_PID = program_map_PID
+      demuxer.subscribe(PMT_PID, PMT_Parser.push)
+
+  def PMT_handler(PMT):
+    global PCR_PID
+    if not PMT.valid(): return
+    if PMT.unchanged: return
+
+    demuxer.unsubscribe(PCR_PID, PCR_handler)
+    PCR_PID = PMT_Table.of(PMT).PCR_PID()
+    demuxer.subscribe(PCR_PID, PCR_handler)
+
+  def PCR_handler(ts):
+    global HEAD
+    if ts.pcr() is None: return
+    first = timeline.first is None
+    timeline.push(ts.pcr())
+    if not first and FIRST_TOT:
+      # TOT の直後の PCR を TOT の時刻として、最初の PCR の時刻まで戻す
+      timeline.anchor(FIRST_TOT)
+      HEAD = timeline.clock_to_time(timeline.first)
+
+  def TOT_handler(TOT):
+    global FIRST_TOT
+    if not TOT.valid(): return
+    if FIRST_TOT: return
+
+    FIRST_TOT = TOT_Table.of(TOT).JST_time()
+
+  PAT_Parser = SectionParser(PAT_handler, cache = SectionCache())
+  PMT_Parser = SectionParser(PMT_handler, cache = SectionCache())
+  TOT_Parser = SectionParser(TOT_handler)
+
+  demuxer.subscribe(0x00, PAT_Parser.push)
+  demuxer.subscribe(0x14, TOT_Parser.push)
+
+  # インデックスがあれば、記録してあるセクションと PCR のパケットだけを順に処理する
+  index = Index.find(args.input, args.index)
+  if index:
+    source = index.reader(args.input) if args.mmap else args.input
+    for kind, offset, pid, data in index.events():
+      if kind == 'section':
+        if pid == 0x00: PAT_handler(Section(data))
+        elif pid == PMT_PID: PMT_handler(Section(data))
+        elif pid == 0x14: TOT_handler(Section(data))
+      elif kind == 'pcr' and pid == PCR_PID:
+        PCR_handler(index.packet(source, offset))
+      if HEAD: break
+  else:
+    for ts in Reader(args.input, prefetch = args.prefetch, mmap = args.mmap):
+      demuxer.push(ts)
+      if HEAD: break
+
+  if HEAD:
+    print(HEAD.astimezone(timezone(timedelta(hours=9))))
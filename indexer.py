@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+from pathlib import Path
+
+from mpeg2ts.reader import Reader
+from mpeg2ts.index import Index
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('ARIB mpeg2ts indexer'))
+
+  parser.add_argument('-i', '--input', type=argparse.FileType('rb'), required=True)
+  parser.add_argument('-o', '--output', type=Path, nargs='?')
+  parser.add_argument('--prefetch', type=int, default=0)
+  parser.add_argument('--mmap', action='store_true')
+
+  args = parser.parse_args()
+
+  size = os.fstat(args.input.fileno()).st_size
+  index = Index.build(Reader(args.input, prefetch = args.prefetch, mmap = args.mmap), size)
+
+  with open(args.output or Path(args.input.name + Index.SUFFIX), 'wb') as output:
+    index.save(output)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+from mpeg2ts.packet import Packet
+
+PID_SIZE = 0x2000
+
+def available():
+  return np is not None
+
+def pid_table(pids):
+  table = np.zeros(PID_SIZE, dtype=bool)
+  table[list(pids)] = True
+  return table
+
+class Headers:
+
+  def __init__(self, block, stride = Packet.PACKET_SIZE, prefix = 0):
+    self.block = memoryview(block)
+    self.stride = stride
+    self.prefix = prefix
+    # 192, 204 byte の場合は前後を除いた 188 byte の部分だけをコピー無しで参照する
+    self.units = np.frombuffer(self.block, dtype=np.uint8).reshape(-1, stride)
+    self.packets = self.units[:, prefix:prefix + Packet.PACKET_SIZE]
+
+    # packet.py の Packet と同じビット配置を列単位でまとめてデコードする
+    byte1, byte2, byte3 = self.packets[:, 1], self.packets[:, 2], self.packets[:, 3]
+    self.transport_error_indicator = (byte1 & 0x80) != 0
+    self.payload_unit_start_indicator = (byte1 & 0x40) != 0
+    self.transport_priority = (byte1 & 0x20) != 0
+    self.pid = ((byte1 & 0x1F).astype(np.uint16) << 8) | byte2
+    self.adaptation_field_control = (byte3 & 0x30) >> 4
+    self.continuity_counter = byte3 & 0x0F
+
+    # PID の表毎のマスクと位置 (表は経路が変わった時に作り直すので、同じ表ならブロック内で使い回す)
+    self.masks = dict()
+    self.indices = dict()
+
+  def __len__(self):
+    return len(self.packets)
+
+  def packet(self, index):
+    begin = index * self.stride
+    timestamp = None
+    if self.prefix:
+      # その行の arrival_time_stamp だけをデコードする
+      timestamp = ((self.block[begin] & 0x3F) << 24) | (self.block[begin + 1] << 16) | (self.block[begin + 2] << 8) | self.block[begin + 3]
+      begin += self.prefix
+    return Packet(self.block[begin:begin + Packet.PACKET_SIZE], timestamp)
+
+  def timestamps(self):
+    # M2TS の arrival_time_stamp (先頭 4 byte の下位 30 bit)
+    fields = self.units[:, 0:4].astype(np.uint32)
+    return ((fields[:, 0] & 0x3F) << 24) | (fields[:, 1] << 16) | (fields[:, 2] << 8) | fields[:, 3]
+
+  def mask(self, table):
+    cached = self.masks.get(id(table))
+    if cached is None or cached[0] is not table:
+      cached = self.masks[id(table)] = (table, table[self.pid])
+    return cached[1]
+
+  def find(self, table, begin = 0):
+    cached = self.indices.get(id(table))
+    if cached is None or cached[0] is not table:
+      cached = self.indices[id(table)] = (table, np.flatnonzero(self.mask(table)))
+    indices = cached[1]
+    position = int(np.searchsorted(indices, begin))
+    return int(indices[position]) if position < len(indices) else len(self)
+
+  def select(self, mask, begin = 0, end = None):
+    return self.packets[begin:end][mask[begin:end]].tobytes()
+
+  def histogram(self):
+    return np.bincount(self.pid, minlength=PID_SIZE)
+
+  def has_adaptation_field(self):
+    return (self.adaptation_field_control & 0x02) != 0
+
+  def has_payload(self):
+    return (self.adaptation_field_control & 0x01) != 0
+
+  def has_pcr(self):
+    return self.has_adaptation_field() & (self.packets[:, Packet.HEADER_SIZE] > 0) & ((self.packets[:, Packet.HEADER_SIZE + 1] & 0x10) != 0)
+
+  def pcr(self):
+    indices = np.flatnonzero(self.has_pcr())
+    fields = self.packets[indices, Packet.HEADER_SIZE + 2:Packet.HEADER_SIZE + 7].astype(np.int64)
+    pcr_base  = fields[:, 0] << 25
+    pcr_base |= fields[:, 1] << 17
+    pcr_base |= fields[:, 2] << 9
+    pcr_base |= fields[:, 3] << 1
+    pcr_base |= fields[:, 4] >> 7
+    return indices, pcr_base
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+
+from mpeg2ts.section import Section
+
+class LRU:
+  SIZE = 256
+
+  def __init__(self, size = SIZE):
+    self.size = size
+    self.entries = OrderedDict()
+    # キャッシュの大きさを決める目安にする
+    self.hits = 0
+    self.misses = 0
+
+  def lookup(self, key):
+    value = self.entries.get(key)
+    if value is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries.move_to_end(key)
+    return value
+
+  def store(self, key, value):
+    self.entries[key] = value
+    self.entries.move_to_end(key)
+    # 最後に参照されたものから残す (EIT のように版が多い PID でも上限を超えない)
+    while len(self.entries) > self.size:
+      self.entries.popitem(last = False)
+    return value
+
+  def __len__(self):
+    return len(self.entries)
+
+  def clear(self):
+    self.entries.clear()
+    self.hits = 0
+    self.misses = 0
+
+class SectionCache(LRU):
+
+  @staticmethod
+  def key(pid, section):
+    return (pid, section.table_id(), section.table_id_extension(), section.section_number())
+
+  @staticmethod
+  def same_version(cached, section):
+    # version_number と current_next_indicator は同じ byte に入っている
+    return cached[5] == section[5]
+
+  @staticmethod
+  def same_CRC(cached, section):
+    return cached[-Section.CRC_SIZE:] == section[-Section.CRC_SIZE:]
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import zlib
+
+POLYNOMIAL = 0x04C11DB7
+
+def _table():
+  table = []
+  for byte in range(256):
+    crc = byte << 24
+    for _ in range(8):
+      crc = ((crc << 1) ^ POLYNOMIAL) if crc & 0x80000000 else (crc << 1)
+      crc &= 0xFFFFFFFF
+    table.append(crc)
+  return tuple(table)
+
+CRC32_TABLE = _table()
+
+# SLICE_TABLES[n][byte]: byte の後ろに n byte の 0 が続いた時の CRC
+SLICE_TABLES = [CRC32_TABLE]
+for _ in range(7):
+  SLICE_TABLES.append(tuple(((crc << 8) & 0xFFFFFFFF) ^ CRC32_TABLE[crc >> 24] for crc in SLICE_TABLES[-1]))
+SLICE_TABLES = tuple(SLICE_TABLES)
+
+# zlib の crc32 は同じ多項式のビット反転版なので、入力と状態をビット反転すれば MPEG-2 の CRC になる
+REVERSE = bytes(int('{:08b}'.format(byte)[::-1], 2) for byte in range(256))
+
+def reflect(crc):
+  return int.from_bytes(crc.to_bytes(4, byteorder='little').translate(REVERSE), byteorder='big')
+
+def CRC32_bitwise(data, crc = 0xFFFFFFFF):
+  for byte in data:
+    for index in range(7, -1, -1):
+      bit = (byte & (1 << index)) >> index
+      c = 1 if crc & 0x80000000 else 0
+      crc <<= 1
+      if c ^ bit: crc ^= POLYNOMIAL
+      crc &= 0xFFFFFFFF
+  return crc
+
+def CRC32_table(data, crc = 0xFFFFFFFF):
+  table = CRC32_TABLE
+  for byte in data:
+    crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+  return crc
+
+def CRC32_slice8(data, crc = 0xFFFFFFFF):
+  T0, T1, T2, T3, T4, T5, T6, T7 = SLICE_TABLES
+  data = memoryview(data).cast('B')
+  end = len(data) - len(data) % 8
+  for index in range(0, end, 8):
+    b0, b1, b2, b3, b4, b5, b6, b7 = data[index:index + 8]
+    one = crc ^ ((b0 << 24) | (b1 << 16) | (b2 << 8) | b3)
+    crc = T7[one >> 24] ^ T6[(one >> 16) & 0xFF] ^ T5[(one >> 8) & 0xFF] ^ T4[one & 0xFF] ^ T3[b4] ^ T2[b5] ^ T1[b6] ^ T0[b7]
+  return CRC32_table(data[end:], crc)
+
+def CRC32(data, crc = 0xFFFFFFFF):
+  state = reflect(crc) ^ 0xFFFFFFFF
+  state = zlib.crc32(bytes(data).translate(REVERSE), state)
+  return reflect(state ^ 0xFFFFFFFF)
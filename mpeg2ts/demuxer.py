@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+class Demuxer:
+  PID_SIZE = 0x2000
+
+  def __init__(self):
+    # PID をそのまま添字にしたハンドラ表 (購読されていない PID は空のタプル)
+    self.handlers = [()] * Demuxer.PID_SIZE
+
+  def subscribe(self, pid, handler):
+    if not (0 <= pid < Demuxer.PID_SIZE): return
+    if handler in self.handlers[pid]: return
+    self.handlers[pid] += (handler,)
+
+  def unsubscribe(self, pid, handler = None):
+    if not (0 <= pid < Demuxer.PID_SIZE): return
+    if handler is None:
+      self.handlers[pid] = ()
+    else:
+      self.handlers[pid] = tuple(subscribed for subscribed in self.handlers[pid] if subscribed != handler)
+
+  def subscribed(self, pid):
+    return 0 <= pid < Demuxer.PID_SIZE and len(self.handlers[pid]) > 0
+
+  def pids(self):
+    return [pid for pid in range(Demuxer.PID_SIZE) if self.handlers[pid]]
+
+  def push(self, packet):
+    handlers = self.handlers[packet.pid()]
+    for handler in handlers:
+      handler(packet)
+    return len(handlers) > 0
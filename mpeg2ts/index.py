@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import struct
+
+from mpeg2ts.packet import Packet
+from mpeg2ts.reader import Reader
+from mpeg2ts.parser import SectionParser
+from mpeg2ts.cache import SectionCache
+from mpeg2ts.demuxer import Demuxer
+from mpeg2ts.psi import PAT, PMT
+
+class Index:
+  MAGIC = b'AIDX'
+  VERSION = 2
+  SUFFIX = '.idx'
+  # PID 毎に PCR を記録する間隔 (90kHz, 1 秒)
+  PCR_INTERVAL = 90000
+
+  HEADER = struct.Struct('<4sHQHB')
+  COUNT = struct.Struct('<I')
+  PCR = struct.Struct('<QHQ')
+  SECTION = struct.Struct('<QHH')
+  PES = struct.Struct('<QQH')
+
+  def __init__(self, size = 0, stride = Packet.PACKET_SIZE, prefix = 0):
+    self.size = size
+    self.stride = stride
+    self.prefix = prefix
+    # (位置, PID, PCR)
+    self.pcrs = []
+    # (セクションが揃ったパケットの位置, PID, セクション): PAT, PMT は版が変わったもの、TDT/TOT は全て
+    self.sections = []
+    # (PES の最初のパケットの位置, 最後のパケットの位置, PID): 字幕の PES
+    self.pes = []
+
+  @staticmethod
+  def build(reader, size = 0, pcr_interval = PCR_INTERVAL):
+    index = Index(size)
+
+    demuxer = Demuxer()
+    latest = dict()
+    recorded = dict()
+    pending = set()
+    PMT_Parsers = dict()
+    opened = dict()
+    current = 0
+
+    def record_pcr(pid):
+      offset, pcr = latest[pid]
+      if recorded.get(pid, (None, None))[0] == offset: return
+      index.pcrs.append((offset, pid, pcr))
+      recorded[pid] = (offset, pcr)
+
+    def snapshot(pid, section):
+      index.sections.append((current, pid, bytes(section)))
+      # TDT/TOT の直前の PCR と、セクションの直後の PCR は必ず記録する (FIRST_PCR, FIRST_TOT_PCR を再現できるように)
+      if pid == 0x14:
+        for pcr_pid in latest: record_pcr(pcr_pid)
+      pending.update(latest)
+
+    def PAT_handler(section):
+      if not section.valid() or section.unchanged: return
+      snapshot(0x00, section)
+      for program in PAT.of(section).programs():
+        if program.program_number() == 0: continue
+        if program.program_map_PID() not in PMT_Parsers:
+          PMT_Parsers[program.program_map_PID()] = SectionParser(PMT_handler(program.program_map_PID()), cache = SectionCache())
+          demuxer.subscribe(program.program_map_PID(), PMT_Parsers[program.program_map_PID()].push)
+
+    def PMT_handler(pid):
+      def handler(section):
+        if not section.valid() or section.unchanged: return
+        snapshot(pid, section)
+        for stream in PMT.of(section).streams():
+          if stream.stream_type() == 0x06 and stream.component_tag() == 0x30:
+            demuxer.subscribe(stream.elementary_PID(), SUBTITLE_handler)
+      return handler
+
+    def SUBTITLE_handler(ts):
+      pid = ts.pid()
+      if ts.payload_unit_start_indicator():
+        if pid in opened: index.pes.append(opened[pid] + (pid,))
+        opened[pid] = (current, current)
+      elif pid in opened:
+        opened[pid] = (opened[pid][0], current)
+
+    def TOT_handler(section):
+      if not section.valid(): return
+      snapshot(0x14, section)
+
+    PAT_Parser = SectionParser(PAT_handler, cache = SectionCache())
+    TOT_Parser = SectionParser(TOT_handler)
+
+    demuxer.subscribe(0x00, PAT_Parser.push)
+    demuxer.subscribe(0x14, TOT_Parser.push)
+
+    for offset, ts in reader.offsets():
+      current = offset
+      pid = ts.pid()
+
+      pcr = ts.pcr()
+      if pcr is not None:
+        latest[pid] = (offset, pcr)
+        if pid in pending or pid not in recorded or (pcr - recorded[pid][1]) % (1 << 33) >= pcr_interval:
+          record_pcr(pid)
+          pending.discard(pid)
+
+      demuxer.push(ts)
+
+    for pid in opened: index.pes.append(opened[pid] + (pid,))
+    index.pes.sort()
+    index.stride, index.prefix = reader.stride, reader.prefix
+    return index
+
+  def events(self):
+    # 位置の順に ('section', 位置, PID, セクション), ('pcr', 位置, PID, PCR), ('pes', 位置, PID, 最後のパケットの位置) を返す
+    events  = [(offset, 0, pid, data) for offset, pid, data in self.sections]
+    events += [(offset, 1, pid, pcr) for offset, pid, pcr in self.pcrs]
+    events += [(begin, 2, pid, end) for begin, end, pid in self.pes]
+    events.sort(key = lambda event: (event[0], event[1]))
+    for offset, kind, pid, data in events:
+      yield ('section', 'pcr', 'pes')[kind], offset, pid, data
+
+  def reader(self, input):
+    # mmap できるファイルなら、記録した位置のパケットを Reader.at() で直接参照する (できなければファイルのまま)
+    reader = Reader(input, mmap = True)
+    if reader.mapping is None: return input
+    reader.stride, reader.prefix = self.stride, self.prefix
+    return reader
+
+  def packet(self, input, offset):
+    if isinstance(input, Reader): return input.at(offset)
+    input.seek(offset + self.prefix)
+    return Packet(input.read(Packet.PACKET_SIZE))
+
+  def packets(self, input, begin, end):
+    # begin から end のパケットまでを、インデックスを作った時の stride と prefix で切り出す
+    if isinstance(input, Reader):
+      data = input.view[begin:end + self.stride]
+    else:
+      input.seek(begin)
+      data = memoryview(input.read(end + self.stride - begin))
+    reader = Reader(io.BufferedReader(io.BytesIO(data)))
+    reader.stride, reader.prefix = self.stride, self.prefix
+    if not bytes(data[self.prefix::self.stride]).lstrip(Packet.SYNC_BYTE):
+      return [reader.packet(data, offset) for offset in range(0, len(data) - self.stride + 1, self.stride)]
+    # 途中に同期ずれがあれば、同じ stride を優先して Reader で同期を取り直す
+    return reader
+
+  @staticmethod
+  def find(input, path = None):
+    # 指定が無ければ入力ファイルの隣の .idx を使う (標準入力や、作った後に変わったファイルなら使わない)
+    try:
+      size = os.fstat(input.fileno()).st_size
+      if path is None and not os.path.isfile(input.name): return None
+      path = path or (input.name + Index.SUFFIX)
+      with open(path, 'rb') as file:
+        index = Index.load(file)
+    except (AttributeError, TypeError, OSError, ValueError, struct.error):
+      return None
+    if index is None or index.size != size: return None
+    return index
+
+  def save(self, output):
+    output.write(Index.HEADER.pack(Index.MAGIC, Index.VERSION, self.size, self.stride, self.prefix))
+
+    output.write(Index.COUNT.pack(len(self.pcrs)))
+    for offset, pid, pcr in self.pcrs:
+      output.write(Index.PCR.pack(offset, pid, pcr))
+
+    output.write(Index.COUNT.pack(len(self.sections)))
+    for offset, pid, data in self.sections:
+      output.write(Index.SECTION.pack(offset, pid, len(data)))
+      output.write(data)
+
+    output.write(Index.COUNT.pack(len(self.pes)))
+    for begin, end, pid in self.pes:
+      output.write(Index.PES.pack(begin, end, pid))
+
+  @staticmethod
+  def load(input):
+    data = memoryview(input.read())
+    magic, version, size, stride, prefix = Index.HEADER.unpack_from(data, 0)
+    if magic != Index.MAGIC or version != Index.VERSION: return None
+    index = Index(size, stride, prefix)
+    begin = Index.HEADER.size
+
+    count, = Index.COUNT.unpack_from(data, begin)
+    begin += Index.COUNT.size
+    index.pcrs = list(Index.PCR.iter_unpack(data[begin:begin + count * Index.PCR.size]))
+    begin += count * Index.PCR.size
+
+    count, = Index.COUNT.unpack_from(data, begin)
+    begin += Index.COUNT.size
+    for _ in range(count):
+      offset, pid, length = Index.SECTION.unpack_from(data, begin)
+      begin += Index.SECTION.size
+      index.sections.append((offset, pid, bytes(data[begin:begin + length])))
+      begin += length
+
+    count, = Index.COUNT.unpack_from(data, begin)
+    begin += Index.COUNT.size
+    index.pes = list(Index.PES.iter_unpack(data[begin:begin + count * Index.PES.size]))
+    return index
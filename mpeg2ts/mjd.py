@@ -1,3 +1,5 @@
+from datetime import datetime
+
 def BCD(byte):
   return (((byte & 0xF0) >> 4) * 10) + (byte & 0x0F)
 
@@ -17,3 +19,8 @@ def YMD_to_MJD(Y, M, D):
   d = D - 1
   n = d + (153 * m + 2) // 5 + (365 * y) + (y // 4) - (y // 100) + (y // 400)
   return n - 678881
+
+def MJD_BCD_to_datetime(data, begin = 0):
+  # MJD (16 bit) と BCD の時分秒 (24 bit): TOT の JST_time や EIT の start_time
+  year, month, day = MJD_to_YMD((data[begin + 0] << 8) + data[begin + 1])
+  return datetime(year, month, day, BCD(data[begin + 2]), BCD(data[begin + 3]), BCD(data[begin + 4]))
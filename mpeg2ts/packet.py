@@ -6,41 +6,57 @@ class Packet:
   SYNC_BYTE = b'\x47'
   STUFFING_BYTE = b'\xff'
 
-  def __init__(self, packet):
-    self.packet = bytearray(packet)
+  __slots__ = ('packet', 'header', 'timestamp')
+
+  def __init__(self, packet, timestamp = None):
+    # memoryview はそのまま参照する (Reader のブロックバッファをコピーしない)
+    self.packet = packet if type(packet) is memoryview else bytearray(packet)
+    self.header = (self.packet[1] << 16) | (self.packet[2] << 8) | self.packet[3]
+    # 192 byte の M2TS から読んだ場合の arrival_time_stamp (27MHz)
+    self.timestamp = timestamp
 
   def __getitem__(self, item):
     return self.packet[item]
 
   def __setitem__(self, key, value):
     self.packet[key] = value
+    self.header = (self.packet[1] << 16) | (self.packet[2] << 8) | self.packet[3]
+
+  def __len__(self):
+    return len(self.packet)
+
+  def __bytes__(self):
+    return bytes(self.packet)
 
   def transport_error_indicator(self):
-    return (self.packet[1] & 0x80) != 0
+    return (self.header & 0x800000) != 0
 
   def payload_unit_start_indicator(self):
-    return (self.packet[1] & 0x40) != 0
+    return (self.header & 0x400000) != 0
 
   def transport_priority(self):
-    return (self.packet[1] & 0x20) != 0
+    return (self.header & 0x200000) != 0
 
   def pid(self):
-    return ((self.packet[1] & 0x1F) << 8) | self.packet[2]
+    return (self.header >> 8) & 0x1FFF
 
   def has_adaptation_field(self):
-    return (self.packet[3] & 0x20) != 0
+    return (self.header & 0x20) != 0
 
   def has_payload(self):
-    return (self.packet[3] & 0x10) != 0
+    return (self.header & 0x10) != 0
 
   def continuity_counter(self):
-    return self.packet[3] & 0x0F
+    return self.header & 0x0F
 
   def adaptation_field_length(self):
-    return self.packet[4] if self.has_adaptation_field() else 0
+    return self.packet[4] if self.header & 0x20 else 0
+
+  def payload_begin(self):
+    return Packet.HEADER_SIZE + (1 + self.packet[4] if self.header & 0x20 else 0)
 
   def pointer_field(self):
-    return self.packet[Packet.HEADER_SIZE + (1 + self.adaptation_field_length() if self.has_adaptation_field() else 0)]
+    return self.packet[self.payload_begin()]
 
   def has_pcr(self):
     return self.has_adaptation_field() and (self.packet[Packet.HEADER_SIZE + 1] & 0x10) != 0
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+from mpeg2ts.packet import Packet
+from mpeg2ts.cache import LRU
+
+class Packetizer:
+  SIZE = 16
+
+  def __init__(self, size = SIZE):
+    self.entries = LRU(size)
+    self.continuity_counter = 0
+
+  @staticmethod
+  def key(section, ts, identity = None):
+    # payload_unit_start_indicator, adaptation_field_control の一部, continuity_counter 以外のヘッダとセクションの中身
+    # (セクションを識別できる値が別にあれば、中身の代わりにそれを使う)
+    return (ts[1] & 0xBF, ts[2], ts[3] & 0xD0, bytes(section) if identity is None else identity)
+
+  @staticmethod
+  def build(section, ts):
+    data = b'\x00' + bytes(section)
+    size = Packet.PACKET_SIZE - Packet.HEADER_SIZE
+    count = max(1, (len(data) + size - 1) // size)
+    data += Packet.STUFFING_BYTE * (count * size - len(data))
+
+    packets = bytearray(count * Packet.PACKET_SIZE)
+    for index in range(count):
+      begin = index * Packet.PACKET_SIZE
+      packets[begin + 0] = ts[0]
+      packets[begin + 1] = (ts[1] & 0xBF) | (0x40 if index == 0 else 0x00)
+      packets[begin + 2] = ts[2]
+      packets[begin + 3] = ts[3] & 0xD0
+      packets[begin + Packet.HEADER_SIZE:begin + Packet.PACKET_SIZE] = data[index * size:(index + 1) * size]
+    return packets
+
+  def packetize(self, section, ts, identity = None):
+    key = Packetizer.key(section, ts, identity)
+    packets = self.entries.lookup(key)
+    if packets is None: packets = self.entries.store(key, Packetizer.build(section, ts))
+
+    # 作ったパケットを使い回すので continuity_counter だけ書き換える (返したものは次の呼び出しまでに書き出すこと)
+    for begin in range(3, len(packets), Packet.PACKET_SIZE):
+      packets[begin] = (packets[begin] & 0xF0) | self.continuity_counter
+      self.continuity_counter = (self.continuity_counter + 1) & 0x0F
+    return packets
@@ -2,49 +2,121 @@
 
 from mpeg2ts.packet import Packet
 from mpeg2ts.section import Section
+from mpeg2ts.cache import SectionCache
 from mpeg2ts.pes import PES
 
 from collections import deque
 
+class SectionFilter:
+
+  def __init__(self, table_id = None, table_id_mask = 0xFF, table_id_extension = None, section_number = None):
+    self.table_id = table_id
+    self.table_id_mask = table_id_mask
+    self.table_id_extension = table_id_extension
+    self.section_number = section_number
+    # 判定に必要なセクション先頭のバイト数 (読み飛ばす長さが分かるように section_length までは必ず待つ)
+    if section_number is not None:
+      self.size = 7
+    elif table_id_extension is not None:
+      self.size = 5
+    else:
+      self.size = 3
+
+  def match(self, section):
+    if len(section) < self.size: return False
+    if self.table_id is not None and (section.table_id() & self.table_id_mask) != (self.table_id & self.table_id_mask): return False
+    if self.table_id_extension is not None and section.table_id_extension() != self.table_id_extension: return False
+    if self.section_number is not None and section.section_number() != self.section_number: return False
+    return True
+
 class SectionParser:
 
-  def __init__(self):
+  def __init__(self, callback = None, verify = True, cache = None, filters = None):
     self.section = None
+    self.skip = 0
     self.queue = deque()
+    self.callback = callback
+    self.verify = verify
+    self.cache = cache
+    self.filters = filters
+    self.filter_size = max(filter.size for filter in filters) if filters else 0
+    self.filtered = False
+    self.key, self.cached = None, None
+
+  def begin(self, size):
+    # フィルタがある場合は通過が決まるまで CRC を計算しない
+    self.section = Section(verify = self.verify and not self.filters, size = size)
+    self.section.unverified = not self.verify
+    self.filtered = not self.filters
+    self.key, self.cached = None, None
+
+  def append(self, pid, payload):
+    section = self.section
+    header = len(section) < Section.HEADER_SIZE
+    section += payload
+
+    if not self.filtered and (len(section) >= self.filter_size or section.fulfilled()):
+      if not any(filter.match(section) for filter in self.filters):
+        # 条件に合わないセクションは残りを読み飛ばす
+        self.skip = section.remains()
+        self.section = None
+        return
+      self.filtered = True
+      if self.verify: section.CRC32()
+
+    if self.cache is not None and header and len(section) >= Section.HEADER_SIZE and section.section_syntax_indicator():
+      self.key = SectionCache.key(pid, section)
+      self.cached = self.cache.lookup(self.key)
+      # 直前と同じ版なら CRC は計算せず、最後に CRC_32 のフィールドだけ比較する
+      if self.cached is not None and SectionCache.same_version(self.cached, section):
+        section.crc = None
+      else:
+        self.cached = None
+
+    if not section.fulfilled(): return
+    self.section = None
+
+    if self.cached is not None and SectionCache.same_CRC(self.cached, section):
+      self.cached.unchanged = True
+      self.queue.append(self.cached)
+    else:
+      if self.key is not None and section.valid():
+        self.cache.store(self.key, section)
+      self.queue.append(section)
 
   def push(self, packet):
-    begin = Packet.HEADER_SIZE + (1 + packet.adaptation_field_length() if packet.has_adaptation_field() else 0)
-    if packet.payload_unit_start_indicator(): begin += 1
+    pid = packet.pid()
+    begin = packet.payload_begin()
+    unit_start = packet.payload_unit_start_indicator()
+    if unit_start: begin += 1
 
-    if not self.section:
-      if packet.payload_unit_start_indicator():
+    if self.section is None and not self.skip:
+      if unit_start:
         begin += packet.pointer_field()
       else:
         return
 
-    if packet.payload_unit_start_indicator():
-      while begin < Packet.PACKET_SIZE:
-        if packet[begin] == Packet.STUFFING_BYTE[0]: break
-        if self.section:
-          next = min(begin + self.section.remains(), Packet.PACKET_SIZE)
-        else:
+    while begin < Packet.PACKET_SIZE:
+      if self.skip:
+        next = min(begin + self.skip, Packet.PACKET_SIZE)
+        self.skip -= next - begin
+      elif self.section is not None:
+        next = min(begin + self.section.remains(), Packet.PACKET_SIZE)
+        self.append(pid, packet[begin:next])
+      elif not unit_start or packet[begin] == Packet.STUFFING_BYTE[0]:
+        break
+      else:
+        # section_length まで読めれば、そのサイズでバッファを確保する
+        if begin + 3 <= Packet.PACKET_SIZE:
           section_length = ((packet[begin + 1] & 0x0F) << 8) | packet[begin + 2]
-          next = min(begin + (3 + section_length), Packet.PACKET_SIZE)
-          self.section = Section()
-        self.section += packet[begin:next]
-
-        if self.section.fulfilled():
-          self.queue.append(self.section)
-          self.section = None
-
-        begin = next
-    else:
-      next = min(begin + self.section.remains(), Packet.PACKET_SIZE)
-      self.section += packet[begin:next]
+          self.begin(3 + section_length)
+        else:
+          self.begin(None)
+        continue
+      begin = next
 
-      if self.section.fulfilled():
-        self.queue.append(self.section)
-        self.section = None
+    if self.callback:
+      while self.queue: self.callback(self.queue.popleft())
 
   def empty(self):
     return not self.queue
@@ -54,28 +126,40 @@ class SectionParser:
 
 class PESParser:
 
-  def __init__(self):
+  def __init__(self, callback = None):
     self.pes = None
     self.queue = deque()
+    self.callback = callback
 
   def push(self, packet):
-    begin = Packet.HEADER_SIZE + (1 + packet.adaptation_field_length() if packet.has_adaptation_field() else 0)
-    if not packet.payload_unit_start_indicator() and not self.pes: return
+    begin = packet.payload_begin()
+    if not packet.payload_unit_start_indicator() and self.pes is None: return
 
     if packet.payload_unit_start_indicator():
-      if self.pes and self.pes.packet_length() == 0:
-        self.queue.append(self.pes)
+      if self.pes is not None and len(self.pes) >= PES.HEADER_SIZE and self.pes.PES_packet_length() == 0:
+        self.queue.append(self.pes.close())
 
-      pes_length = (packet[begin + 3] << 16) | (packet[begin + 4] << 8) | packet[begin + 5]
-      next = min(begin + (PES.HEADER_SIZE + pes_length), Packet.PACKET_SIZE)
-      self.pes = PES(packet[begin:next])
-    else:
+      # PES_packet_length まで読めれば、そのサイズでバッファを確保する (0 なら長さ不定)
+      if begin + PES.HEADER_SIZE <= Packet.PACKET_SIZE:
+        pes_length = (packet[begin + 4] << 8) | packet[begin + 5]
+        size = PES.HEADER_SIZE + pes_length if pes_length else 0
+      else:
+        size = None
+      self.pes = PES(size = size)
+
+    # ヘッダが埋まるまでは PES_packet_length が分からないので、残りを見直しながら追加する
+    while begin < Packet.PACKET_SIZE:
       next = min(begin + self.pes.remains(), Packet.PACKET_SIZE)
       self.pes += packet[begin:next]
+      begin = next
+
+      if self.pes.fulfilled():
+        self.queue.append(self.pes)
+        self.pes = None
+        break
 
-    if self.pes.fulfilled():
-      self.queue.append(self.pes)
-      self.pes = None
+    if self.callback:
+      while self.queue: self.callback(self.queue.popleft())
 
   def empty(self):
     return not self.queue
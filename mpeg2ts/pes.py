@@ -5,11 +5,26 @@ import math
 class PES:
   HEADER_SIZE = 6
 
-  def __init__(self, payload = b''):
-    self.payload = bytearray(payload)
+  def __init__(self, payload = b'', size = None):
+    # PESParser は PES_packet_length から分かる 6 + PES_packet_length を size に渡すので、その長さで確保して TS の断片を埋めていく
+    # PES_packet_length が 0 (映像の PES など) の場合は長さが分からないので、size を 0 にして断片を溜め、close() でまとめる
+    self.payload = bytearray(size) if size else bytearray()
+    self.chunks = [] if size == 0 else None
+    self.length = 0
+    self += payload
 
   def __iadd__(self, payload):
-    self.payload += payload
+    if self.chunks is not None and self.length >= PES.HEADER_SIZE:
+      self.chunks.append(bytes(payload))
+    else:
+      self.payload[self.length:self.length + len(payload)] = payload
+    self.length += len(payload)
+    return self
+
+  def close(self):
+    if self.chunks:
+      self.payload += b''.join(self.chunks)
+    self.chunks = None
     return self
 
   def __getitem__(self, item):
@@ -19,7 +34,7 @@ class PES:
     self.payload[key] = value
 
   def __len__(self):
-    return len(self.payload)
+    return self.length
 
   def packet_start_code_prefix(self):
     return (self.payload[0] << 16) | (self.payload[1] << 8) | self.payload[2]
@@ -31,13 +46,17 @@ class PES:
     return (self.payload[4] << 8) | self.payload[5]
 
   def remains(self):
-    if self.PES_packet_length() == 0:
+    if self.length < PES.HEADER_SIZE:
+      return PES.HEADER_SIZE - self.length
+    elif self.PES_packet_length() == 0:
       return math.inf
     else:
-      return max(0, (PES.HEADER_SIZE + self.PES_packet_length()) - len(self.payload))
+      return max(0, (PES.HEADER_SIZE + self.PES_packet_length()) - self.length)
 
   def fulfilled(self):
-    if self.PES_packet_length() == 0:
-      return false
+    if self.length < PES.HEADER_SIZE:
+      return False
+    elif self.PES_packet_length() == 0:
+      return False
     else:
-      return len(self.payload) >= PES.HEADER_SIZE + self.PES_packet_length()
+      return self.length >= PES.HEADER_SIZE + self.PES_packet_length()
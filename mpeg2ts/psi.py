@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+from datetime import timedelta
+
+from mpeg2ts.section import Section
+from mpeg2ts.mjd import BCD, MJD_BCD_to_datetime
+
+class Descriptor:
+  __slots__ = ('data', 'begin')
+
+  def __init__(self, data, begin):
+    # セクションの bytearray を直接参照する
+    self.data = data
+    self.begin = begin
+
+  def __getitem__(self, item):
+    # descriptor_tag, descriptor_length の後ろからの位置で参照する
+    return self.data[self.begin + 2 + item]
+
+  def __len__(self):
+    return 2 + self.descriptor_length()
+
+  def __bytes__(self):
+    return bytes(self.data[self.begin:self.begin + len(self)])
+
+  def descriptor_tag(self):
+    return self.data[self.begin + 0]
+
+  def descriptor_length(self):
+    return self.data[self.begin + 1]
+
+def descriptors(data, begin, end):
+  while begin + 2 <= end:
+    descriptor = Descriptor(data, begin)
+    yield descriptor
+    begin += len(descriptor)
+
+class Program:
+  __slots__ = ('data', 'begin')
+  SIZE = 4
+
+  def __init__(self, data, begin):
+    self.data = data
+    self.begin = begin
+
+  def __len__(self):
+    return Program.SIZE
+
+  def __bytes__(self):
+    return bytes(self.data[self.begin:self.begin + Program.SIZE])
+
+  def program_number(self):
+    return (self.data[self.begin + 0] << 8) | self.data[self.begin + 1]
+
+  def program_map_PID(self):
+    # program_number が 0 の場合は network_PID
+    return ((self.data[self.begin + 2] & 0x1F) << 8) | self.data[self.begin + 3]
+
+class Stream:
+  __slots__ = ('data', 'begin', 'tag')
+  HEADER_SIZE = 5
+
+  def __init__(self, data, begin):
+    self.data = data
+    self.begin = begin
+    self.tag = -1
+
+  def __len__(self):
+    return Stream.HEADER_SIZE + self.ES_info_length()
+
+  def __bytes__(self):
+    return bytes(self.data[self.begin:self.begin + len(self)])
+
+  def stream_type(self):
+    return self.data[self.begin + 0]
+
+  def elementary_PID(self):
+    return ((self.data[self.begin + 1] & 0x1F) << 8) | self.data[self.begin + 2]
+
+  def ES_info_length(self):
+    return ((self.data[self.begin + 3] & 0x0F) << 8) | self.data[self.begin + 4]
+
+  def descriptors(self):
+    begin = self.begin + Stream.HEADER_SIZE
+    return descriptors(self.data, begin, begin + self.ES_info_length())
+
+  def component_tag(self):
+    # stream_identifier_descriptor (0x52) が無ければ None
+    if self.tag == -1:
+      self.tag = None
+      data = self.data
+      begin = self.begin + Stream.HEADER_SIZE
+      end = begin + (((data[self.begin + 3] & 0x0F) << 8) | data[self.begin + 4])
+      while begin + 2 < end:
+        if data[begin] == 0x52:
+          self.tag = data[begin + 2]
+          break
+        begin += 2 + data[begin + 1]
+    return self.tag
+
+class Event:
+  __slots__ = ('data', 'begin')
+  HEADER_SIZE = 12
+
+  def __init__(self, data, begin):
+    self.data = data
+    self.begin = begin
+
+  def __len__(self):
+    return Event.HEADER_SIZE + self.descriptors_loop_length()
+
+  def __bytes__(self):
+    return bytes(self.data[self.begin:self.begin + len(self)])
+
+  def event_id(self):
+    return (self.data[self.begin + 0] << 8) | self.data[self.begin + 1]
+
+  def start_time(self):
+    # 未定義 (全て 1) の場合は None
+    if all(self.data[self.begin + 2 + index] == 0xFF for index in range(5)): return None
+    return MJD_BCD_to_datetime(self.data, self.begin + 2)
+
+  def duration(self):
+    if all(self.data[self.begin + 7 + index] == 0xFF for index in range(3)): return None
+    return timedelta(hours = BCD(self.data[self.begin + 7]), minutes = BCD(self.data[self.begin + 8]), seconds = BCD(self.data[self.begin + 9]))
+
+  def running_status(self):
+    return (self.data[self.begin + 10] & 0xE0) >> 5
+
+  def free_CA_mode(self):
+    return (self.data[self.begin + 10] & 0x10) != 0
+
+  def descriptors_loop_length(self):
+    return ((self.data[self.begin + 10] & 0x0F) << 8) | self.data[self.begin + 11]
+
+  def descriptors(self):
+    begin = self.begin + Event.HEADER_SIZE
+    return descriptors(self.data, begin, begin + self.descriptors_loop_length())
+
+class Service:
+  __slots__ = ('data', 'begin')
+  HEADER_SIZE = 5
+
+  def __init__(self, data, begin):
+    self.data = data
+    self.begin = begin
+
+  def __len__(self):
+    return Service.HEADER_SIZE + self.descriptors_loop_length()
+
+  def __bytes__(self):
+    return bytes(self.data[self.begin:self.begin + len(self)])
+
+  def service_id(self):
+    return (self.data[self.begin + 0] << 8) | self.data[self.begin + 1]
+
+  def EIT_schedule_flag(self):
+    return (self.data[self.begin + 2] & 0x02) != 0
+
+  def EIT_present_following_flag(self):
+    return (self.data[self.begin + 2] & 0x01) != 0
+
+  def running_status(self):
+    return (self.data[self.begin + 3] & 0xE0) >> 5
+
+  def free_CA_mode(self):
+    return (self.data[self.begin + 3] & 0x10) != 0
+
+  def descriptors_loop_length(self):
+    return ((self.data[self.begin + 3] & 0x0F) << 8) | self.data[self.begin + 4]
+
+  def descriptors(self):
+    begin = self.begin + Service.HEADER_SIZE
+    return descriptors(self.data, begin, begin + self.descriptors_loop_length())
+
+class Table:
+
+  def __init__(self, section):
+    self.section = section
+    # ループの各要素 (最初に参照した時にまとめて解析し、途中で打ち切られても次からはそのまま使う)
+    self.entries = None
+
+  @classmethod
+  def of(cls, section):
+    # SectionCache から同じ版の Section が返ってくる間は、解析結果ごと使い回す
+    if not isinstance(section.table, cls): section.table = cls(section)
+    return section.table
+
+  def __getitem__(self, item):
+    return self.section[item]
+
+  def end(self):
+    return 3 + self.section.section_length() - Section.CRC_SIZE
+
+  def loop(self):
+    if self.entries is None: self.entries = self.walk()
+    return iter(self.entries)
+
+class PAT(Table):
+
+  def programs(self):
+    return self.loop()
+
+  def walk(self):
+    data = self.section.payload
+    return [Program(data, begin) for begin in range(Section.HEADER_SIZE, self.end() - Program.SIZE + 1, Program.SIZE)]
+
+  def program_map_PID(self, program_number):
+    for program in self.programs():
+      if program.program_number() == program_number: return program.program_map_PID()
+    return None
+
+class PMT(Table):
+
+  def PCR_PID(self):
+    return ((self.section[Section.HEADER_SIZE + 0] & 0x1F) << 8) | self.section[Section.HEADER_SIZE + 1]
+
+  def program_info_length(self):
+    return ((self.section[Section.HEADER_SIZE + 2] & 0x0F) << 8) | self.section[Section.HEADER_SIZE + 3]
+
+  def program_info(self):
+    begin = Section.HEADER_SIZE + 4
+    return descriptors(self.section.payload, begin, begin + self.program_info_length())
+
+  def streams(self):
+    return self.loop()
+
+  def walk(self):
+    data, entries = self.section.payload, []
+    begin = Section.HEADER_SIZE + 4 + self.program_info_length()
+    end = self.end()
+    while begin + Stream.HEADER_SIZE <= end:
+      entries.append(Stream(data, begin))
+      begin += Stream.HEADER_SIZE + (((data[begin + 3] & 0x0F) << 8) | data[begin + 4])
+    return entries
+
+class TOT(Table):
+  # TDT (0x70) も JST_time までは同じ並び
+
+  def JST_time(self):
+    return MJD_BCD_to_datetime(self.section.payload, 3)
+
+  def descriptors_loop_length(self):
+    if self.section.table_id() != 0x73: return 0
+    return ((self.section[8] & 0x0F) << 8) | self.section[9]
+
+  def descriptors(self):
+    return descriptors(self.section.payload, 10, 10 + self.descriptors_loop_length())
+
+class EIT(Table):
+
+  def service_id(self):
+    return self.section.table_id_extension()
+
+  def transport_stream_id(self):
+    return (self.section[Section.HEADER_SIZE + 0] << 8) | self.section[Section.HEADER_SIZE + 1]
+
+  def original_network_id(self):
+    return (self.section[Section.HEADER_SIZE + 2] << 8) | self.section[Section.HEADER_SIZE + 3]
+
+  def segment_last_section_number(self):
+    return self.section[Section.HEADER_SIZE + 4]
+
+  def last_table_id(self):
+    return self.section[Section.HEADER_SIZE + 5]
+
+  def events(self):
+    return self.loop()
+
+  def walk(self):
+    data, entries = self.section.payload, []
+    begin = Section.HEADER_SIZE + 6
+    end = self.end()
+    while begin + Event.HEADER_SIZE <= end:
+      entries.append(Event(data, begin))
+      begin += Event.HEADER_SIZE + (((data[begin + 10] & 0x0F) << 8) | data[begin + 11])
+    return entries
+
+class SDT(Table):
+
+  def transport_stream_id(self):
+    return self.section.table_id_extension()
+
+  def original_network_id(self):
+    return (self.section[Section.HEADER_SIZE + 0] << 8) | self.section[Section.HEADER_SIZE + 1]
+
+  def services(self):
+    return self.loop()
+
+  def walk(self):
+    data, entries = self.section.payload, []
+    begin = Section.HEADER_SIZE + 3
+    end = self.end()
+    while begin + Service.HEADER_SIZE <= end:
+      entries.append(Service(data, begin))
+      begin += Service.HEADER_SIZE + (((data[begin + 3] & 0x0F) << 8) | data[begin + 4])
+    return entries
+
+  def service(self, service_id):
+    for service in self.services():
+      if service.service_id() == service_id: return service
+    return None
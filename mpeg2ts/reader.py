@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import os
+import stat
+import mmap
+import threading
+import queue
+
+from mpeg2ts.packet import Packet
+
+class Reader:
+  BLOCK_SIZE = Packet.PACKET_SIZE * 5000
+  SYNC_LOCK = 4
+  # (パケットの間隔, 同期バイトの前にある byte 数): TS, タイムスタンプ付きの M2TS, リードソロモン符号付きの TS
+  STRIDES = ((188, 0), (192, 4), (204, 0))
+  MAX_STRIDE = 204
+  MAX_PREFIX = 4
+  # 前のブロックの残り (同期の確定待ちの分も含む) をコピーせずに先頭へ詰められるように空けておく
+  HEADROOM = MAX_STRIDE * (SYNC_LOCK + 1)
+
+  def __init__(self, input, block_size = BLOCK_SIZE, prefetch = 0, mmap = False, end = None):
+    self.input = input
+    # ファイル内のこの位置までで読み込みを止める (シークして一部分だけ処理する場合)
+    self.end = end
+    self.block_size = max(Packet.PACKET_SIZE, block_size - block_size % Packet.PACKET_SIZE)
+    self.prefetch = prefetch
+    self.stride, self.prefix = Reader.STRIDES[0]
+    # 今のブロックの先頭がファイルのどの位置にあたるか (offsets() で使う)
+    self.base = 0
+    self.mapping = self.map() if mmap else None
+    # 最後に madvise した内容 (at() で毎回呼ばないように)
+    self.advice = None
+    self.view = memoryview(self.mapping) if self.mapping is not None else None
+
+  def map(self):
+    # 通常のファイルの場合だけ mmap する (標準入力のパイプなどは従来通り読み込む)
+    try:
+      fd = self.input.fileno()
+      if not stat.S_ISREG(os.fstat(fd).st_mode): return None
+      if os.fstat(fd).st_size == 0: return None
+      return mmap.mmap(fd, 0, access = mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+      return None
+
+  def advise(self, advice):
+    if advice == self.advice: return
+    self.advice = advice
+    if self.mapping is not None and hasattr(self.mapping, 'madvise'):
+      self.mapping.madvise(advice)
+
+  def at(self, position):
+    # インデックスなどから直接参照する場合は先読みさせない
+    if hasattr(mmap, 'MADV_RANDOM'): self.advise(mmap.MADV_RANDOM)
+    return self.packet(self.view, position)
+
+  def packet(self, view, position):
+    # M2TS の場合は先頭 4 byte の下位 30 bit が arrival_time_stamp
+    if self.prefix:
+      timestamp = ((view[position] & 0x3F) << 24) | (view[position + 1] << 16) | (view[position + 2] << 8) | view[position + 3]
+      position += self.prefix
+      return Packet(view[position:position + Packet.PACKET_SIZE], timestamp)
+    return Packet(view[position:position + Packet.PACKET_SIZE])
+
+  def read(self):
+    # 払い出した Packet がブロックを参照し続けられるように、ブロック毎に新しいバッファへ読み込む
+    buffer = bytearray(Reader.HEADROOM + self.block_size)
+    size = self.block_size
+    if self.end is not None: size = max(0, min(size, self.end - self.input.tell()))
+    length = self.input.readinto(memoryview(buffer)[Reader.HEADROOM:Reader.HEADROOM + size]) if size else 0
+    return buffer, length or 0
+
+  def prefetcher(self, blocks, stop):
+    try:
+      while not stop.is_set():
+        buffer, length = self.read()
+        # キューが一杯の間は読み込みを止める (読み進め過ぎない)
+        while not stop.is_set():
+          try:
+            blocks.put((buffer, length), timeout = 0.1)
+            break
+          except queue.Full:
+            pass
+        if not length: return
+    except Exception as e:
+      blocks.put((e, 0))
+
+  def reads(self):
+    if not self.prefetch:
+      while True:
+        buffer, length = self.read()
+        yield buffer, length
+        if not length: return
+
+    # readinto は GIL を解放するので、別スレッドで先読みしている間に前のブロックを処理できる
+    blocks = queue.Queue(maxsize = self.prefetch)
+    stop = threading.Event()
+    thread = threading.Thread(target = self.prefetcher, args = (blocks, stop), daemon = True)
+    thread.start()
+    try:
+      while True:
+        buffer, length = blocks.get()
+        if isinstance(buffer, Exception): raise buffer
+        yield buffer, length
+        if not length: return
+    finally:
+      stop.set()
+
+  def confirm(self, buffer, position, stride, end, eof, prefix = 0):
+    for index in range(1, Reader.SYNC_LOCK + 1):
+      next = position + index * stride
+      if next >= end:
+        # 確定に必要な分が読めていないので続きを待つ (EOF なら読めた分で確定するが、その間隔でパケットが 1 つも入らなければ違う)
+        if not eof: return None
+        return position - prefix + stride <= end
+      if buffer[next] != Packet.SYNC_BYTE[0]: return False
+    return True
+
+  def sync(self, buffer, begin, end, eof):
+    # 今の間隔を優先して、188, 192, 204 byte の間隔で同期バイトが続く位置を探す
+    strides = [(self.stride, self.prefix)] + [stride for stride in Reader.STRIDES if stride[0] != self.stride]
+    search = begin
+    while True:
+      position = buffer.find(Packet.SYNC_BYTE, search, end)
+      # 次のブロックの先頭が同期バイトの場合に備えて、タイムスタンプの分は残しておく
+      if position < 0: return max(begin, end - Reader.MAX_PREFIX), False
+
+      waiting = False
+      for stride, prefix in strides:
+        if position - prefix < begin: continue
+        confirmed = self.confirm(buffer, position, stride, end, eof, prefix)
+        if confirmed is None:
+          waiting = True
+          break
+        if confirmed:
+          # M2TS ではタイムスタンプの上位 byte が 0x47 のまま続くことがあるので、直後に本来の同期バイトの並びが無いか確かめる
+          for shift in range(prefix, 0, -1):
+            if self.confirm(buffer, position + shift, stride, end, eof, prefix):
+              position += shift
+              break
+          self.stride, self.prefix = stride, prefix
+          return position - prefix, True
+      if waiting: return max(begin, position - Reader.MAX_PREFIX), False
+      search = position + 1
+
+  def scan(self, buffer, view, begin, end, eof, locked):
+    while begin < end:
+      if not locked:
+        begin, locked = self.sync(buffer, begin, end, eof)
+        if not locked: break
+
+      # 同期バイトを stride 付きスライスでまとめて取り出して、同期が続いているパケット数を数える
+      count = (end - begin) // self.stride
+      syncs = buffer[begin + self.prefix:begin + self.prefix + count * self.stride:self.stride]
+      synced = count - len(syncs.lstrip(Packet.SYNC_BYTE))
+      if synced > 0:
+        yield view, begin, synced
+        begin += synced * self.stride
+      if synced < count:
+        locked = False
+      else:
+        break
+    return begin, locked
+
+  def runs(self):
+    if self.mapping is not None:
+      yield from self.mapped_runs()
+      return
+
+    remains = b''
+    locked = False
+    try:
+      consumed = self.input.tell()
+    except (AttributeError, OSError):
+      consumed = 0
+
+    for buffer, length in self.reads():
+      eof = not length
+      begin = Reader.HEADROOM - len(remains)
+      if begin < 0:
+        buffer = bytearray(remains) + buffer[Reader.HEADROOM:Reader.HEADROOM + length]
+        begin = 0
+      else:
+        buffer[begin:Reader.HEADROOM] = remains
+      self.base = consumed - len(remains) - begin
+      consumed += length
+      view = memoryview(buffer)
+      end = begin + len(remains) + length
+
+      begin, locked = yield from self.scan(buffer, view, begin, end, eof, locked)
+      remains = bytes(view[begin:end])
+
+  def mapped_runs(self):
+    # ファイル全体を mmap して、読み込みのコピー無しにページを直接参照する
+    if hasattr(mmap, 'MADV_SEQUENTIAL'): self.advise(mmap.MADV_SEQUENTIAL)
+    size = len(self.mapping) if self.end is None else max(0, min(len(self.mapping), self.end))
+    begin = self.input.tell()
+    locked = False
+    self.base = 0
+
+    while True:
+      # 一度に Headers などで扱う範囲が大きくなりすぎないように block_size 毎に区切る (同期の確定に必要な分は余分に見る)
+      end = min(size, begin + self.block_size + Reader.HEADROOM)
+      eof = end == size
+      begin, locked = yield from self.scan(self.mapping, self.view, begin, end, eof, locked)
+      if eof: return
+
+  def blocks(self):
+    # 188 byte 以外の場合は stride と prefix を合わせて mpeg2ts.batch.Headers に渡す
+    for view, begin, count in self.runs():
+      yield view[begin:begin + count * self.stride]
+
+  def offsets(self):
+    # ファイル内の位置 (パケットの先頭, M2TS ならタイムスタンプの位置) と Packet の組を返す
+    for view, begin, count in self.runs():
+      for position in range(begin, begin + count * self.stride, self.stride):
+        yield self.base + position, self.packet(view, position)
+
+  def __iter__(self):
+    for view, begin, count in self.runs():
+      if self.prefix:
+        for position in range(begin, begin + count * self.stride, self.stride):
+          yield self.packet(view, position)
+      else:
+        for position in range(begin, begin + count * self.stride, self.stride):
+          yield Packet(view[position:position + Packet.PACKET_SIZE])
@@ -1,14 +1,30 @@
 #!/usr/bin/env python3
 
+from mpeg2ts.crc import CRC32
+
 class Section:
   HEADER_SIZE = 8
   CRC_SIZE = 4
 
-  def __init__(self, payload = b''):
-    self.payload = bytearray(payload)
+  def __init__(self, payload = b'', verify = False, size = None):
+    # SectionParser は section_length を読めた時点で 3 + section_length を size に渡すので、その長さで確保して断片を埋めていく
+    self.payload = bytearray(size) if size else bytearray()
+    self.length = 0
+    # verify の場合は追加されたデータ毎に CRC を更新しておき、CRC32() で再計算しない
+    self.crc = 0xFFFFFFFF if verify else None
+    self += payload
+    # SectionCache で以前と同じ版だと分かったセクションは unchanged になる
+    self.unchanged = False
+    # verify しない SectionParser から来たセクションは unverified になり、valid() で CRC を確かめない
+    self.unverified = False
+    # mpeg2ts.psi の Table.of() で解析したものを覚えておく
+    self.table = None
 
   def __iadd__(self, payload):
-    self.payload += payload
+    end = self.length + len(payload)
+    self.payload[self.length:end] = payload
+    self.length = end
+    if self.crc is not None: self.crc = CRC32(payload, self.crc)
     return self
 
   def __getitem__(self, item):
@@ -16,13 +32,20 @@ class Section:
 
   def __setitem__(self, key, value):
     self.payload[key] = value
+    self.crc = None
 
   def __len__(self):
-    return len(self.payload)
+    return self.length
+
+  def __bytes__(self):
+    return bytes(memoryview(self.payload)[:self.length])
 
   def table_id(self):
     return self.payload[0]
 
+  def section_syntax_indicator(self):
+    return (self.payload[1] & 0x80) != 0
+
   def section_length(self):
     return ((self.payload[1] & 0x0F) << 8) | self.payload[2]
 
@@ -42,19 +65,15 @@ class Section:
     return self.payload[7]
 
   def remains(self):
-    return max(0, (3 + self.section_length()) - len(self.payload))
+    if self.length < 3: return 3 - self.length
+    return max(0, (3 + self.section_length()) - self.length)
 
   def fulfilled(self):
-    return len(self.payload) >= 3 + self.section_length()
+    return self.length >= 3 and self.length >= 3 + self.section_length()
 
   def CRC32(self):
-    crc = 0xFFFFFFFF
-    for byte in self.payload:
-      for index in range(7, -1, -1):
-        bit = (byte & (1 << index)) >> index
-        c = 1 if crc & 0x80000000 else 0
-        crc <<= 1
-        if c ^ bit: crc ^= 0x04c11db7
-        crc &= 0xFFFFFFFF
-    return crc
+    if self.crc is None: self.crc = CRC32(memoryview(self.payload)[:self.length])
+    return self.crc
 
+  def valid(self):
+    return self.unverified or self.CRC32() == 0
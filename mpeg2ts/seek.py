@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import io
+import os
+
+from mpeg2ts.packet import Packet
+from mpeg2ts.reader import Reader
+from mpeg2ts.parser import SectionParser
+from mpeg2ts.demuxer import Demuxer
+from mpeg2ts.psi import TOT as TOT_Table
+
+class Seeker:
+  # 1 回の探りで読む量 (PCR は 100ms 以内の間隔で入るので、高いビットレートでも数個は含まれる)
+  PROBE_SIZE = Packet.PACKET_SIZE * 4000
+  # 探った位置で集める PCR の数 (途中で不連続な PCR を拾わないように)
+  SAMPLES = 3
+  # 連続しているとみなす PCR の間隔 (90kHz, 1 秒)
+  MAX_GAP = 90000
+  PCR_CYCLE = 1 << 33
+
+  def __init__(self, input, pid = None):
+    self.input = input
+    self.size = os.fstat(input.fileno()).st_size
+    # PCR_PID (指定が無ければ最初に PCR が見つかった PID)
+    self.pid = pid
+    self.probes = 0
+    self.first = self.probe(0)
+    if self.first is None: raise ValueError('PCR not found')
+
+  def probe(self, begin):
+    # begin から PROBE_SIZE だけ読んで、最初の (位置, PCR) を返す
+    self.probes += 1
+    self.input.seek(begin)
+    data = self.input.read(Seeker.PROBE_SIZE)
+    samples = []
+    for offset, ts in Reader(io.BufferedReader(io.BytesIO(data))).offsets():
+      if self.pid is not None and ts.pid() != self.pid: continue
+      pcr = ts.pcr()
+      if pcr is None: continue
+      if self.pid is None: self.pid = ts.pid()
+      # 不連続があれば、その後の PCR から集め直す
+      if samples and (pcr - samples[-1][1]) % Seeker.PCR_CYCLE > Seeker.MAX_GAP: samples = []
+      samples.append((begin + offset, pcr))
+      if len(samples) >= Seeker.SAMPLES: break
+    return samples[0] if samples else None
+
+  def elapsed(self, pcr):
+    # 最初の PCR からの経過 (33 bit で一周した場合も含む)
+    return (pcr - self.first[1] + Seeker.PCR_CYCLE) % Seeker.PCR_CYCLE
+
+  def seek(self, target):
+    # 最初の PCR からの経過が target (90kHz) に最も近い PCR のパケットの位置を返す
+    if target <= 0: return self.first[0]
+    low, high = self.first[0], self.size
+    while high - low > Seeker.PROBE_SIZE:
+      middle = (low + high) // 2
+      sample = self.probe(middle)
+      if sample is None or self.elapsed(sample[1]) > target:
+        high = middle
+      else:
+        low = middle
+
+    # 残りは順に読んで、target を挟む PCR のうち近い方を選ぶ
+    self.input.seek(low)
+    best = None
+    for offset, ts in Reader(self.input, end = high + Seeker.PROBE_SIZE).offsets():
+      if ts.pid() != self.pid: continue
+      pcr = ts.pcr()
+      if pcr is None: continue
+      distance = self.elapsed(pcr) - target
+      if best is None or abs(distance) < best[1]: best = (offset, abs(distance))
+      if distance >= 0: break
+    return best[0] if best else low
+
+  def anchor(self):
+    # 最初の TOT と、その直前の PCR の組
+    self.input.seek(self.first[0])
+    demuxer = Demuxer()
+    pcr = None
+    anchor = None
+
+    def PCR_handler(ts):
+      nonlocal pcr
+      if ts.pcr() is not None: pcr = ts.pcr()
+
+    def TOT_handler(TOT):
+      nonlocal anchor
+      if TOT.valid() and anchor is None: anchor = (TOT_Table.of(TOT).JST_time(), pcr)
+
+    TOT_Parser = SectionParser(TOT_handler)
+
+    def TOT_push(ts):
+      # 最初の PCR より前の TOT は使わない
+      if pcr is not None: TOT_Parser.push(ts)
+
+    demuxer.subscribe(self.pid, PCR_handler)
+    demuxer.subscribe(0x14, TOT_push)
+    for ts in Reader(self.input):
+      demuxer.push(ts)
+      if anchor is not None: return anchor
+    return None
+
+  def seek_time(self, time):
+    # TOT から求めた時刻 (JST, naive な datetime) に最も近い PCR のパケットの位置を返す
+    anchor = self.anchor()
+    if anchor is None: raise ValueError('TOT not found')
+    TOT, pcr = anchor
+    return self.seek(self.elapsed(pcr) + round((time - TOT).total_seconds() * 90000))
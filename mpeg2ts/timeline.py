@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+from bisect import bisect_right
+from datetime import timedelta
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+class Timeline:
+  CLOCK = 90000
+  CYCLE = 1 << 33
+  HALF = 1 << 32
+
+  def __init__(self):
+    # 最初と直前の PCR (33 bit の周回を展開した 64 bit の値)
+    self.first = None
+    self.last = None
+    # TOT を受け取った時点の展開済みの PCR と、その時刻 (PCR の順に並べる)
+    self.clocks = []
+    self.times = []
+
+  def unwrap(self, value):
+    # 直前の PCR の前後 2^32 (約 13 時間) の範囲にあるものとして展開する (PTS も同じ)
+    if self.last is None: return value
+    return self.last + ((value - self.last + Timeline.HALF) % Timeline.CYCLE) - Timeline.HALF
+
+  def push(self, pcr):
+    clock = self.unwrap(pcr)
+    if self.first is None: self.first = clock
+    self.last = clock
+    return clock
+
+  def unwraps(self, values):
+    # 並んだ PCR/PTS を前の値からの差で順に展開する (NumPy の配列ならまとめて計算する)
+    if np is not None and isinstance(values, np.ndarray):
+      if len(values) == 0: return values.astype(np.int64)
+      base = int(values[0]) if self.last is None else self.last
+      deltas = np.diff(values.astype(np.int64), prepend = base)
+      return base + np.cumsum((deltas + Timeline.HALF) % Timeline.CYCLE - Timeline.HALF)
+    clocks = []
+    last = self.last
+    for value in values:
+      last = value if last is None else last + ((value - last + Timeline.HALF) % Timeline.CYCLE) - Timeline.HALF
+      clocks.append(last)
+    return clocks
+
+  def anchor(self, time, pcr = None):
+    # TOT の時刻と、その時点の PCR (省略された場合は直前の PCR) を記録する
+    clock = self.last if pcr is None else self.unwrap(pcr)
+    if clock is None: return
+    index = bisect_right(self.clocks, clock)
+    self.clocks.insert(index, clock)
+    self.times.insert(index, time)
+
+  def elapsed(self, value):
+    # 最初の PCR からの経過秒数
+    return (self.unwrap(value) - self.first) / Timeline.CLOCK
+
+  def time(self, value):
+    return self.clock_to_time(self.unwrap(value))
+
+  def clock_to_time(self, clock):
+    if not self.clocks: return None
+    index = bisect_right(self.clocks, clock)
+    if 0 < index < len(self.clocks) and self.clocks[index] != self.clocks[index - 1]:
+      # TOT の間は前後の TOT で線形に補間する
+      begin, end = self.clocks[index - 1], self.clocks[index]
+      return self.times[index - 1] + (self.times[index] - self.times[index - 1]) * ((clock - begin) / (end - begin))
+    # 最初の TOT より前と最後の TOT より後は、近い方の TOT から 90kHz で数える
+    index = max(0, min(index - 1, len(self.clocks) - 1))
+    return self.times[index] + timedelta(seconds = (clock - self.clocks[index]) / Timeline.CLOCK)
+
+  def elapsed_all(self, values):
+    return [(clock - self.first) / Timeline.CLOCK for clock in self.unwraps(values)]
+
+  def time_all(self, values):
+    return [self.clock_to_time(int(clock)) for clock in self.unwraps(values)]
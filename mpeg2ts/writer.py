@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import io
+import os
+
+from mpeg2ts.packet import Packet
+
+class Writer:
+  BLOCK_SIZE = Packet.PACKET_SIZE * 5000
+
+  def __init__(self, output, block_size = BLOCK_SIZE, writev = True):
+    self.output = output
+    self.block_size = max(Packet.PACKET_SIZE, block_size - block_size % Packet.PACKET_SIZE)
+    self.chunks = []
+    self.buffer = bytearray()
+    self.size = 0
+
+    # os.writev が使えてファイルディスクリプタがある場合は、パケットをコピーせずに参照を溜めてまとめて書き出す
+    self.fd = None
+    if writev and hasattr(os, 'writev'):
+      try:
+        self.fd = output.fileno()
+      except (AttributeError, io.UnsupportedOperation):
+        self.fd = None
+    try:
+      self.iov_max = os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+      self.iov_max = 1024
+
+  def write(self, data):
+    if self.fd is not None:
+      # bytearray は呼び出し元で書き換えられることがある (Packetizer など) のでコピーしておく
+      self.chunks.append(bytes(data) if type(data) is bytearray else data)
+    else:
+      self.buffer += data
+    self.size += len(data)
+    if self.size >= self.block_size: self.flush()
+    return len(data)
+
+  def flush(self):
+    if self.fd is not None:
+      # 先に output 側のバッファを書き出しておく (順番が入れ替わらないように)
+      self.output.flush()
+      begin = 0
+      while begin < len(self.chunks):
+        written = os.writev(self.fd, self.chunks[begin:begin + self.iov_max])
+        while begin < len(self.chunks) and written >= len(self.chunks[begin]):
+          written -= len(self.chunks[begin])
+          begin += 1
+        if written > 0: self.chunks[begin] = memoryview(self.chunks[begin])[written:]
+      self.chunks.clear()
+    elif self.buffer:
+      self.output.write(self.buffer)
+      self.buffer = bytearray()
+      self.output.flush()
+    self.size = 0
+
+  def close(self):
+    self.flush()
+    self.output.close()
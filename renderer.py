@@ -6,15 +6,21 @@ import os
 import subprocess
 import tempfile
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from PIL import Image
 
 from mpeg2ts.packet import Packet
+from mpeg2ts.reader import Reader
+from mpeg2ts.index import Index
 from mpeg2ts.section import Section
 from mpeg2ts.parser import SectionParser, PESParser
-from mpeg2ts.mjd import BCD, MJD_to_YMD
+from mpeg2ts.demuxer import Demuxer
+from mpeg2ts.cache import SectionCache
+from mpeg2ts.psi import PAT as PAT_Table, PMT as PMT_Table, TOT as TOT_Table
+from mpeg2ts.timeline import Timeline
 from subtitle.render import Renderer
+from subtitle.cache import FontCache, GlyphCache
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description=('ARIB subtitle renderer'))
@@ -26,137 +32,131 @@ if __name__ == "__main__":
   parser.add_argument('--format', type=str, default='{:d}')
   parser.add_argument('--TOT', action='store_true')
   parser.add_argument('--ffmpeg', action='store_true')
+  parser.add_argument('--prefetch', type=int, default=0)
+  parser.add_argument('--mmap', action='store_true')
+  parser.add_argument('--index', type=Path, nargs='?')
+  parser.add_argument('--font', type=str, default=FontCache.PATH)
+  parser.add_argument('--glyph_cache', type=int, default=GlyphCache.SIZE)
 
   args = parser.parse_args()
   os.makedirs(args.output_path, exist_ok=True)
 
-  PAT_Parser = SectionParser()
-  PMT_Parser = SectionParser()
-  TOT_Parser = SectionParser()
-  SUBTITLE_Parser = PESParser()
+  demuxer = Demuxer()
 
   PMT_PID = -1
   PCR_PID = -1
   SUBTITLE_PID = -1
 
-  FIRST_PCR = None
   RENDER_COUNT = 0
 
-  FIRST_TOT = None
-  FIRST_TOT_PCR = None
-
-  while args.input:
-    while True:
-      sync_byte = args.input.read(1)
-      if not sync_byte: sys.exit()
-      if sync_byte == Packet.SYNC_BYTE: break
-
-    packet = Packet.SYNC_BYTE + args.input.read(Packet.PACKET_SIZE - 1)
-    ts = Packet(packet)
-
-    if ts.pid() == 0x00:
-      PAT_Parser.push(ts)
-      while not PAT_Parser.empty():
-        PAT = PAT_Parser.pop()
-        if PAT.CRC32() != 0: continue
-
-        begin = Section.HEADER_SIZE
-        while begin < 3 + PAT.section_length() - Section.CRC_SIZE:
-          program_number = (PAT[begin + 0] << 8) | PAT[begin + 1]
-          program_map_PID = ((PAT[begin + 2] & 0x1F) << 8) | PAT[begin + 3]
-
-          if program_number == args.SID:
-            PMT_PID = program_map_PID
-
-          begin += 4
-    elif ts.pid() == PMT_PID:
-      PMT_Parser.push(ts)
-      while not PMT_Parser.empty():
-        PMT = PMT_Parser.pop()
-        if PMT.CRC32() != 0: continue
-
-        PCR_PID = ((PMT[Section.HEADER_SIZE + 0] & 0x1F) << 8) | PMT[Section.HEADER_SIZE + 1]
-        program_info_length = ((PMT[Section.HEADER_SIZE + 2] & 0x0F) << 8) | PMT[Section.HEADER_SIZE + 3]
-
-        begin = Section.HEADER_SIZE + 4 + program_info_length
-        while begin < 3 + PMT.section_length() - Section.CRC_SIZE:
-          stream_type = PMT[begin + 0]
-          elementary_PID = ((PMT[begin + 1] & 0x1F) << 8) | PMT[begin + 2]
-          ES_info_length = ((PMT[begin + 3] & 0x0F) << 8) | PMT[begin + 4]
-
-          descriptor = begin + 5
-          while descriptor < (begin + 5 + ES_info_length):
-            descriptor_tag = PMT[descriptor + 0]
-            descriptor_length = PMT[descriptor + 1]
-            if descriptor_tag == 0x52:
-              component_tag = PMT[descriptor + 2]
-              if stream_type == 0x06 and component_tag == 0x30: # Aプロファイルの字幕のデフォルトESが 0x30  (ARIB TR-B14 2 4.2.8.1 コンポーネントタグの運用)
-                SUBTITLE_PID = elementary_PID
-            descriptor += 2 + descriptor_length
-
-          begin += 5 + ES_info_length
-    elif ts.pid() == PCR_PID:
-      if not FIRST_PCR:
-        FIRST_PCR = ts.pcr()
-      if args.TOT and not FIRST_TOT:
-        FIRST_TOT_PCR = ts.pcr()
-    elif args.TOT and ts.pid() == 0x14:
-      TOT_Parser.push(ts)
-      while not TOT_Parser.empty():
-        TOT = TOT_Parser.pop()
-        if TOT.CRC32() != 0: continue
-        if FIRST_TOT: continue
-        if not FIRST_TOT_PCR: continue
-
-        MJD = (TOT[3 + 0] << 8) + TOT[3 + 1]
-        year, month, day = MJD_to_YMD(MJD)
-        hour = BCD(TOT[3 + 2])
-        min = BCD(TOT[3 + 3])
-        sec = BCD(TOT[3 + 4])
-
-        FIRST_TOT = datetime(year, month, day, hour, min, sec)
-
-    elif ts.pid() == SUBTITLE_PID:
-      SUBTITLE_Parser.push(ts)
-      while not SUBTITLE_Parser.empty():
-        SUBTITLE = SUBTITLE_Parser.pop()
-        if args.TOT and not FIRST_TOT: continue
-
-        renderer = Renderer(SUBTITLE)
-        renderer.render()
-        if renderer.fgImage:
-          image = Image.new('RGBA', renderer.swf)
-          image.alpha_composite(renderer.bgImage)
-          image.alpha_composite(renderer.fgImage)
-
-          elapsed_seconds = timedelta(seconds = (((1 << 33) + (renderer.PTS() - FIRST_PCR)) % (1 << 33)) / 90000)
-
-          if args.TOT:
-            elapsed_TOT_seconds = timedelta(seconds = (((1 << 33) + (renderer.PTS() - FIRST_TOT_PCR)) % (1 << 33)) / 90000)
-            renderer_time = FIRST_TOT + elapsed_TOT_seconds
-            renderer_time_str = renderer_time.strftime('%Y%m%d%H%M%S%f')
-            output_path = args.output_path.joinpath('{}.{}'.format(renderer_time_str, args.suffix))
-          else:
-            output_path = args.output_path.joinpath('{}.{}'.format(args.format.format(RENDER_COUNT), args.suffix))
-            RENDER_COUNT += 1
-
-          if args.ffmpeg:
-            output_ffmpeg_path = args.output_path.joinpath('{}-ffmpeg.{}'.format(args.format.format(RENDER_COUNT), args.suffix))
-            ffmpeg = subprocess.Popen([
-             'ffmpeg',
-             '-ss', str(elapsed_seconds.total_seconds()),
-             '-i', args.input.name,
-             '-frames:v', '1',
-             '-s', '1920x1080',
-             output_ffmpeg_path,
-            ])
-            ffmpeg.wait()
-
-            ffmpeg_image = Image.open(output_ffmpeg_path)
-            ffmpeg_image.putalpha(255)
-            ffmpeg_image.alpha_composite(image.resize((ffmpeg_image.width, ffmpeg_image.height)))
-            ffmpeg_image.save(output_path)
-            os.remove(output_ffmpeg_path)
-          else:
-            image.save(output_path)
-
+  fonts = FontCache(args.font)
+  glyphs = GlyphCache(args.glyph_cache)
+
+  # PCR を展開した時計と、TOT の時刻との対応
+  timeline = Timeline()
+
+  def PAT_handler(PAT):
+    global PMT_PID
+    if not PAT.valid(): return
+    if PAT.unchanged: return
+
+    program_map_PID = PAT_Table.of(PAT).program_map_PID(args.SID)
+    if program_map_PID is not None and program_map_PID != PMT_PID:
+      demuxer.unsubscribe(PMT_PID, PMT_Parser.push)
+      PMT_PID = program_map_PID
+      demuxer.subscribe(PMT_PID, PMT_Parser.push)
+
+  def PMT_handler(PMT):
+    global PCR_PID, SUBTITLE_PID
+    if not PMT.valid(): return
+    if PMT.unchanged: return
+
+    PMT = PMT_Table.of(PMT)
+
+    demuxer.unsubscribe(PCR_PID, PCR_handler)
+    PCR_PID = PMT.PCR_PID()
+    demuxer.subscribe(PCR_PID, PCR_handler)
+
+    for stream in PMT.streams():
+      if stream.stream_type() == 0x06 and stream.component_tag() == 0x30: # Aプロファイルの字幕のデフォルトESが 0x30  (ARIB TR-B14 2 4.2.8.1 コンポーネントタグの運用)
+        demuxer.unsubscribe(SUBTITLE_PID, SUBTITLE_Parser.push)
+        SUBTITLE_PID = stream.elementary_PID()
+        demuxer.subscribe(SUBTITLE_PID, SUBTITLE_Parser.push)
+
+  def PCR_handler(ts):
+    if ts.pcr() is None: return
+    timeline.push(ts.pcr())
+
+  def TOT_handler(TOT):
+    if not TOT.valid(): return
+    if timeline.last is None: return
+
+    timeline.anchor(TOT_Table.of(TOT).JST_time())
+
+  def SUBTITLE_handler(SUBTITLE):
+    global RENDER_COUNT
+    if timeline.first is None: return
+    if args.TOT and not timeline.clocks: return
+
+    renderer = Renderer(SUBTITLE, fonts, glyphs)
+    renderer.render()
+    if renderer.fgImage:
+      image = Image.new('RGBA', renderer.swf)
+      image.alpha_composite(renderer.bgImage)
+      image.alpha_composite(renderer.fgImage)
+
+      elapsed_seconds = timedelta(seconds = max(0, timeline.elapsed(renderer.PTS())))
+
+      if args.TOT:
+        renderer_time = timeline.time(renderer.PTS())
+        renderer_time_str = renderer_time.strftime('%Y%m%d%H%M%S%f')
+        output_path = args.output_path.joinpath('{}.{}'.format(renderer_time_str, args.suffix))
+      else:
+        output_path = args.output_path.joinpath('{}.{}'.format(args.format.format(RENDER_COUNT), args.suffix))
+        RENDER_COUNT += 1
+
+      if args.ffmpeg:
+        output_ffmpeg_path = args.output_path.joinpath('{}-ffmpeg.{}'.format(args.format.format(RENDER_COUNT), args.suffix))
+        ffmpeg = subprocess.Popen([
+         'ffmpeg',
+         '-ss', str(elapsed_seconds.total_seconds()),
+         '-i', args.input.name,
+         '-frames:v', '1',
+         '-s', '1920x1080',
+         output_ffmpeg_path,
+        ])
+        ffmpeg.wait()
+
+        ffmpeg_image = Image.open(output_ffmpeg_path)
+        ffmpeg_image.putalpha(255)
+        ffmpeg_image.alpha_composite(image.resize((ffmpeg_image.width, ffmpeg_image.height)))
+        ffmpeg_image.save(output_path)
+        os.remove(output_ffmpeg_path)
+      else:
+        image.save(output_path)
+
+  PAT_Parser = SectionParser(PAT_handler, cache = SectionCache())
+  PMT_Parser = SectionParser(PMT_handler, cache = SectionCache())
+  TOT_Parser = SectionParser(TOT_handler)
+  SUBTITLE_Parser = PESParser(SUBTITLE_handler)
+
+  demuxer.subscribe(0x00, PAT_Parser.push)
+  if args.TOT: demuxer.subscribe(0x14, TOT_Parser.push)
+
+  # インデックスがあれば、記録してあるセクションと PCR, 字幕の PES のパケットだけを順に処理する
+  index = Index.find(args.input, args.index)
+  if index:
+    source = index.reader(args.input) if args.mmap else args.input
+    for kind, offset, pid, data in index.events():
+      if kind == 'section':
+        if pid == 0x00: PAT_handler(Section(data))
+        elif pid == PMT_PID: PMT_handler(Section(data))
+        elif pid == 0x14 and args.TOT: TOT_handler(Section(data))
+      elif kind == 'pcr' and pid == PCR_PID:
+        PCR_handler(index.packet(source, offset))
+      elif kind == 'pes' and pid == SUBTITLE_PID:
+        for ts in index.packets(source, offset, data):
+          if ts.pid() == pid: SUBTITLE_Parser.push(ts)
+  else:
+    for ts in Reader(args.input, prefetch = args.prefetch, mmap = args.mmap):
+      demuxer.push(ts)
@@ -3,13 +3,15 @@
 import argparse
 import sys
 import os
-from datetime import datetime
 from pathlib import Path
 
 from mpeg2ts.packet import Packet
-from mpeg2ts.section import Section
-from mpeg2ts.parser import SectionParser
-from mpeg2ts.mjd import BCD, MJD_to_YMD
+from mpeg2ts.reader import Reader
+from mpeg2ts.writer import Writer
+from mpeg2ts.parser import SectionParser, SectionFilter
+from mpeg2ts.demuxer import Demuxer
+from mpeg2ts.cache import SectionCache
+from mpeg2ts.psi import EIT as EIT_Table
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description=('ARIB mpeg2ts segmenter'))
@@ -17,47 +19,39 @@ if __name__ == "__main__":
   parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?', default=sys.stdin.buffer)
   parser.add_argument('-o', '--output_path', type=Path, nargs='?', default=Path(os.getcwd()))
   parser.add_argument('-s', '--SID', type=int, required=True)
+  parser.add_argument('--prefetch', type=int, default=0)
+  parser.add_argument('--mmap', action='store_true')
 
   args = parser.parse_args()
   os.makedirs(args.output_path, exist_ok=True)
 
-  EIT_Parser = SectionParser()
+  demuxer = Demuxer()
   current = None
   segment = None
 
-  while args.input:
-    while True:
-      sync_byte = args.input.read(1)
-      if not sync_byte: sys.exit()
-      if sync_byte == Packet.SYNC_BYTE: break
-
-    packet = Packet.SYNC_BYTE + args.input.read(Packet.PACKET_SIZE - 1)
-    ts = Packet(packet)
-
-    if ts.pid() == 0x12:
-      EIT_Parser.push(ts)
-      while not EIT_Parser.empty():
-        EIT = EIT_Parser.pop()
-        if EIT.CRC32() != 0: continue
-        if EIT.table_id() != 0x4e: continue
-        if EIT.section_number() != 0: continue
-        if EIT.table_id_extension() != args.SID: continue
-
-        MJD = (EIT[Section.HEADER_SIZE + 6 + 2 + 0] << 8) + EIT[Section.HEADER_SIZE + 6 + 2 + 1]
-        year, month, day = MJD_to_YMD(MJD)
-        hour = BCD(EIT[Section.HEADER_SIZE + 6 + 2 + 2])
-        min = BCD(EIT[Section.HEADER_SIZE + 6 + 2 + 3])
-        sec = BCD(EIT[Section.HEADER_SIZE + 6 + 2 + 4])
-        starttime = datetime(year, month, day, hour, min, sec)
-        if starttime != current:
-          current = starttime
-          if segment: segment.close()
-          path = args.output_path.joinpath(starttime.strftime('%Y%m%d%H%M%S.ts'))
-          os.makedirs(path.parent, exist_ok=True)
-          segment = open(path, 'wb')
-
-      if segment: segment.write(packet)
-    else:
-      if segment: segment.write(packet)
+  def EIT_handler(EIT):
+    global current, segment
+    if not EIT.valid(): return
+    if EIT.unchanged: return
+
+    # 現在の番組 (section_number = 0) の最初のイベントの開始時刻
+    event = next(EIT_Table.of(EIT).events(), None)
+    if event is None or event.start_time() is None: return
+    starttime = event.start_time()
+    if starttime != current:
+      current = starttime
+      # 番組の切り替わりで溜まっている分を書き出してから次のファイルに切り替える
+      if segment: segment.close()
+      path = args.output_path.joinpath(starttime.strftime('%Y%m%d%H%M%S.ts'))
+      os.makedirs(path.parent, exist_ok=True)
+      segment = Writer(open(path, 'wb'))
+
+  # EIT[p/f actual] の現在の番組 (section_number = 0) 以外はセクションを組み立てずに読み飛ばす
+  EIT_Parser = SectionParser(EIT_handler, cache = SectionCache(), filters = [SectionFilter(table_id = 0x4e, table_id_extension = args.SID, section_number = 0)])
+  demuxer.subscribe(0x12, EIT_Parser.push)
+
+  for ts in Reader(args.input, prefetch = args.prefetch, mmap = args.mmap):
+    demuxer.push(ts)
+    if segment: segment.write(ts.packet)
 
   if segment: segment.close()
@@ -2,99 +2,178 @@
 
 import argparse
 import sys
+import os
+from pathlib import Path
 
 from mpeg2ts.packet import Packet
+from mpeg2ts.reader import Reader
+from mpeg2ts.writer import Writer
 from mpeg2ts.section import Section
 from mpeg2ts.parser import SectionParser
+from mpeg2ts.demuxer import Demuxer
+from mpeg2ts.cache import SectionCache
+from mpeg2ts.packetizer import Packetizer
+from mpeg2ts.psi import PAT as PAT_Table, PMT as PMT_Table
+from mpeg2ts.seek import Seeker
+from mpeg2ts import batch
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description=('ARIB mpeg2ts splitter'))
 
+  def timestamp(value):
+    # 秒か HH:MM:SS(.f) を 90kHz に
+    seconds = 0
+    for field in value.split(':'): seconds = seconds * 60 + float(field)
+    return round(seconds * 90000)
+
   parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?', default=sys.stdin.buffer)
   parser.add_argument('-o', '--output', type=argparse.FileType('wb'), nargs='?', default=sys.stdout.buffer)
-  parser.add_argument('-s', '--SID', type=int, required=True)
+  parser.add_argument('-s', '--SID', type=int, nargs='+')
   parser.add_argument('-p', '--PID', type=int, nargs='*')
+  parser.add_argument('--all', action='store_true')
+  parser.add_argument('--output_path', type=Path, nargs='?', default=Path(os.getcwd()))
+  parser.add_argument('--format', type=str, default='{:d}.ts')
+  parser.add_argument('--prefetch', type=int, default=0)
+  parser.add_argument('--mmap', action='store_true')
+  parser.add_argument('--start', type=timestamp, nargs='?')
+  parser.add_argument('--end', type=timestamp, nargs='?')
 
   args = parser.parse_args()
-
-  PAT_Parser = SectionParser()
-  PAT_Continuity_Counter = 0
-
-  PMT_Parser = SectionParser()
-
-  PMT_PID = -1
-  SID_PIDS = []
-
-  while args.input:
-    while True:
-      sync_byte = args.input.read(1)
-      if not sync_byte: sys.exit()
-      if sync_byte == Packet.SYNC_BYTE: break
-
-    packet = Packet.SYNC_BYTE + args.input.read(Packet.PACKET_SIZE - 1)
-    ts = Packet(packet)
-
-    if ts.pid() == 0x00:
-      PAT_Parser.push(ts)
-      while not PAT_Parser.empty():
-        PAT = PAT_Parser.pop()
-        if PAT.CRC32() != 0: continue
-
-        modified = Section(PAT[0:Section.HEADER_SIZE])
-
-        begin = Section.HEADER_SIZE
-        while begin < 3 + PAT.section_length() - Section.CRC_SIZE:
-          program_number = (PAT[begin + 0] << 8) | PAT[begin + 1]
-          program_map_PID = ((PAT[begin + 2] & 0x1F) << 8) | PAT[begin + 3]
-
-          if program_number == args.SID:
-            PMT_PID = program_map_PID
-            modified += PAT[begin:begin+4]
-
-          begin += 4
-        section_length = len(modified) + Section.CRC_SIZE - 3
-        modified[1] = (modified[1] & 0xF0) & ((section_length & 0x0F00) >> 8)
-        modified[2] = (section_length & 0xFF)
-        modified += modified.CRC32().to_bytes(Section.CRC_SIZE, byteorder="big")
-
-        begin = 0
-        while begin < 3 + modified.section_length():
-          header  = ts[0].to_bytes(1, byteorder="big")
-          header += ((ts[1] & 0xBF) | ((1 if begin == 0 else 0) << 6)).to_bytes(1, byteorder="big")
-          header += ts[2].to_bytes(1, byteorder="big")
-          header += ((ts[3] & 0xD0) | (PAT_Continuity_Counter & 0x0F)).to_bytes(1, byteorder="big")
-          PAT_Continuity_Counter += 1
-          PAT_Continuity_Counter &= 0x0F;
-
-          next = min(3 + PAT.section_length(), begin + (Packet.PACKET_SIZE - Packet.HEADER_SIZE) - (1 if begin == 0 else 0))
-          payload = (b'\x00' if begin == 0 else b'') + modified[begin:next]
-          payload += Packet.STUFFING_BYTE * max(0, Packet.PACKET_SIZE - (Packet.HEADER_SIZE + len(payload)))
-          args.output.write(header + payload)
-
-          begin = next
-
-    elif ts.pid() == PMT_PID:
-      PMT_Parser.push(ts)
-      while not PMT_Parser.empty():
-        PMT = PMT_Parser.pop()
-        if PMT.CRC32() != 0: continue
-
-        PCR_PID = ((PMT[Section.HEADER_SIZE + 0] & 0x1F) << 8) | PMT[Section.HEADER_SIZE + 1]
-        program_info_length = ((PMT[Section.HEADER_SIZE + 2] & 0x0F) << 8) | PMT[Section.HEADER_SIZE + 3]
-
-        SID_PIDS.clear()
-        SID_PIDS.append(PCR_PID)
-
-        begin = Section.HEADER_SIZE + 4 + program_info_length
-        while begin < 3 + PMT.section_length() - Section.CRC_SIZE:
-          stream_type = PMT[begin + 0]
-          elementary_PID = ((PMT[begin + 1] & 0x1F) << 8) | PMT[begin + 2]
-          ES_info_length = ((PMT[begin + 3] & 0x0F) << 8) | PMT[begin + 4]
-          SID_PIDS.append(elementary_PID)
-          begin += 5 + ES_info_length
-
-      args.output.write(packet)
-    elif ts.pid() in SID_PIDS:
-      args.output.write(packet)
-    elif args.PID and ts.pid() in args.PID:
-      args.output.write(packet)
+  if not args.SID and not args.all: parser.error('the following arguments are required: -s/--SID (or --all)')
+  if (args.start is not None or args.end is not None) and not args.input.seekable(): parser.error('--start/--end require a seekable input file')
+
+  # SID が 1 つだけなら従来通り --output へ、複数 (か --all) なら SID 毎のファイルへ 1 回の読み込みで書き出す
+  MULTIPLE = args.all or len(args.SID) > 1
+  if MULTIPLE: os.makedirs(args.output_path, exist_ok=True)
+
+  demuxer = Demuxer()
+
+  PAT_Parser = SectionParser(cache = SectionCache())
+  PMT_Parsers = dict()
+
+  OUTPUTS = dict()
+  WRITERS = dict()
+  PAT_Packetizers = dict()
+  MODIFIED_PATS = dict()
+  PMT_PIDS = dict()
+  SID_PIDS = dict()
+  OUTPUT_PIDS = dict()
+  # batch で使う PID の表 (経路が変わった時だけ作り直す)
+  PSI_TABLE = None
+  OUTPUT_TABLES = dict()
+
+  def writer(output):
+    def write(ts):
+      output.write(ts.packet)
+    return write
+
+  def service(SID):
+    if SID in OUTPUTS: return
+    OUTPUTS[SID] = Writer(open(args.output_path.joinpath(args.format.format(SID)), 'wb') if MULTIPLE else args.output)
+    WRITERS[SID] = writer(OUTPUTS[SID])
+    PAT_Packetizers[SID] = Packetizer()
+    MODIFIED_PATS[SID] = dict()
+    PMT_PIDS[SID] = -1
+    SID_PIDS[SID] = []
+    OUTPUT_PIDS[SID] = set()
+    route(SID)
+
+  def route(SID):
+    pids = set(pid for pid in [PMT_PIDS[SID]] + SID_PIDS[SID] + (args.PID or []) if 0x00 < pid < Demuxer.PID_SIZE)
+    for pid in OUTPUT_PIDS[SID] - pids: demuxer.unsubscribe(pid, WRITERS[SID])
+    for pid in pids - OUTPUT_PIDS[SID]: demuxer.subscribe(pid, WRITERS[SID])
+    if batch.available() and (pids != OUTPUT_PIDS[SID] or SID not in OUTPUT_TABLES):
+      OUTPUT_TABLES[SID] = batch.pid_table(pids)
+    OUTPUT_PIDS[SID] = pids
+
+  def PSI_route():
+    global PSI_TABLE
+    if batch.available(): PSI_TABLE = batch.pid_table([0x00] + list(PMT_Parsers))
+
+  def PMT_route(SID, PMT_PID):
+    # PMT の PID を複数のサービスで共有している場合もあるので、PID 毎に 1 つのパーサで処理する
+    previous = PMT_PIDS[SID]
+    PMT_PIDS[SID] = PMT_PID
+    if previous in PMT_Parsers and previous not in PMT_PIDS.values():
+      demuxer.unsubscribe(previous, PMT_Parsers.pop(previous).push)
+    if PMT_PID not in PMT_Parsers:
+      PMT_Parsers[PMT_PID] = SectionParser(PMT_handler, cache = SectionCache())
+      demuxer.subscribe(PMT_PID, PMT_Parsers[PMT_PID].push)
+    PSI_route()
+    route(SID)
+
+  def PAT_handler(ts):
+    PAT_Parser.push(ts)
+    while not PAT_Parser.empty():
+      PAT = PAT_Parser.pop()
+      if not PAT.valid(): continue
+
+      # 同じ版の PAT なら前回書き換えたものをそのまま使う
+      if not PAT.unchanged:
+        if args.all:
+          for program in PAT_Table.of(PAT).programs():
+            if program.program_number() != 0: service(program.program_number())
+
+        for SID in OUTPUTS:
+          modified = Section(PAT[0:Section.HEADER_SIZE])
+
+          for program in PAT_Table.of(PAT).programs():
+            if program.program_number() == SID:
+              if program.program_map_PID() != PMT_PIDS[SID]:
+                PMT_route(SID, program.program_map_PID())
+              modified += bytes(program)
+          section_length = len(modified) + Section.CRC_SIZE - 3
+          modified[1] = (modified[1] & 0xF0) | ((section_length & 0x0F00) >> 8)
+          modified[2] = (section_length & 0xFF)
+          modified += modified.CRC32().to_bytes(Section.CRC_SIZE, byteorder="big")
+          MODIFIED_PATS[SID][PAT.section_number()] = modified
+
+      for SID in OUTPUTS:
+        modified = MODIFIED_PATS[SID][PAT.section_number()]
+        OUTPUTS[SID].write(PAT_Packetizers[SID].packetize(modified, ts))
+
+  def PMT_handler(PMT):
+    if not PMT.valid(): return
+
+    SID = PMT.table_id_extension()
+    if SID not in OUTPUTS: return
+    if PMT.unchanged and SID_PIDS[SID]: return
+    PMT = PMT_Table.of(PMT)
+
+    SID_PIDS[SID].clear()
+    SID_PIDS[SID].append(PMT.PCR_PID())
+    for stream in PMT.streams():
+      SID_PIDS[SID].append(stream.elementary_PID())
+    route(SID)
+
+  demuxer.subscribe(0x00, PAT_handler)
+  PSI_route()
+  for SID in args.SID or []: service(SID)
+
+  # 切り出す範囲は最初の PCR からの経過時間で指定して、PCR を二分探索した位置だけを読み込む
+  end = None
+  if args.start is not None or args.end is not None:
+    seeker = Seeker(args.input)
+    if args.end is not None: end = seeker.seek(args.end)
+    args.input.seek(seeker.seek(args.start) if args.start is not None else 0)
+  reader = Reader(args.input, prefetch = args.prefetch, mmap = args.mmap, end = end)
+  if batch.available():
+    for block in reader.blocks():
+      headers = batch.Headers(block, reader.stride, reader.prefix)
+      begin = 0
+      while begin < len(headers):
+        # PSI は Demuxer で 1 パケットずつ処理し、その間のパケットはサービス毎のマスクでまとめて書き出す (マスクは表が変わらない限りブロック毎に 1 回だけ作る)
+        stop = headers.find(PSI_TABLE, begin)
+        for SID in OUTPUTS:
+          OUTPUTS[SID].write(headers.select(headers.mask(OUTPUT_TABLES[SID]), begin, stop))
+        if stop < len(headers): demuxer.push(headers.packet(stop))
+        begin = stop + 1
+  else:
+    for ts in reader:
+      demuxer.push(ts)
+
+  for output in OUTPUTS.values():
+    if MULTIPLE:
+      output.close()
+    else:
+      output.flush()
@@ -0,0 +1,28 @@
+from PIL import ImageFont
+
+from mpeg2ts.cache import LRU
+
+class FontCache(LRU):
+  SIZE = 8
+  PATH = 'wlcmaru2004aribu.ttf'
+
+  def __init__(self, path = PATH, size = SIZE):
+    super().__init__(size)
+    self.path = path
+
+  def font(self, pixels, path = None):
+    # TTF を開いて解析するのは重いので、(フォントのパス, 大きさ) 毎に使い回す (実際に使われる SSM の大きさは数種類)
+    key = (path or self.path, pixels)
+    font = self.lookup(key)
+    if font is None: font = self.store(key, ImageFont.truetype(key[0], pixels))
+    return font
+
+class GlyphCache(LRU):
+  SIZE = 1024
+
+  def __init__(self, size = SIZE):
+    super().__init__(size)
+
+# 指定が無い場合にプロセス内で共有するキャッシュ
+FONTS = FontCache()
+GLYPHS = GlyphCache()
@@ -1,3 +1,5 @@
+import sys
+
 from subtitle.JIS8 import G_SET, G_DRCS
 
 class Dictionary:
@@ -15,7 +17,55 @@ class Dictionary:
   def __contains__(self, key):
     return key in self.mapping
 
-class HIRAGANA(Dictionary):
+class CodeTable(Dictionary):
+  # 固定の文字集合は dict ではなく (ch1 - 0x21) * 94 + (ch2 - 0x21) で引く平らなタプルで持つ (未定義の符号は None)
+  CODES = 94
+
+  def __init__(self, size, mapping):
+    codes = [None] * (CodeTable.CODES ** size)
+    for key, value in mapping.items():
+      codes[self.index(size, key)] = sys.intern(value) if type(value) == str else value
+    codes = tuple(codes)
+    # 同じ内容の表はインスタンス間で同じタプルを使う
+    super().__init__(size, INTERNED.setdefault(codes, codes))
+
+  @staticmethod
+  def index(size, key):
+    ch1, ch2 = key >> 8, key & 0xFF
+    if not (0x21 <= ch2 <= 0x7E): return -1
+    if size == 1: return ch2 - 0x21 if ch1 == 0 else -1
+    if not (0x21 <= ch1 <= 0x7E): return -1
+    return (ch1 - 0x21) * CodeTable.CODES + (ch2 - 0x21)
+
+  def __getitem__(self, item):
+    ch1, ch2 = item >> 8, item & 0xFF
+    if self.size == 2 and 0x21 <= ch1 <= 0x7E and 0x21 <= ch2 <= 0x7E:
+      value = self.mapping[(ch1 - 0x21) * CodeTable.CODES + (ch2 - 0x21)]
+    elif self.size == 1 and ch1 == 0 and 0x21 <= ch2 <= 0x7E:
+      value = self.mapping[ch2 - 0x21]
+    else:
+      value = None
+    if value is None: raise KeyError(item)
+    return value
+
+  def __setitem__(self, key, value):
+    raise TypeError('{} is read only'.format(type(self).__name__))
+
+  def __contains__(self, key):
+    index = CodeTable.index(self.size, key)
+    return index >= 0 and self.mapping[index] is not None
+
+INTERNED = dict()
+
+# 文字集合の表は作るのに時間がかかるので、プロセス内で一度だけ作って Renderer 間で共有する (読み取り専用)
+TABLES = dict()
+
+def table(dictionary):
+  if dictionary not in TABLES:
+    TABLES[dictionary] = dictionary()
+  return TABLES[dictionary]
+
+class HIRAGANA(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -27,7 +77,7 @@ class HIRAGANA(Dictionary):
       0x70 : 'ゐ', 0x71 : 'ゑ', 0x72 : 'を', 0x73 : 'ん', 0x77 : 'ゝ', 0x78 : 'ゞ', 0x79 : 'ー', 0x7A : '。', 0x7B : '「', 0x7C : '」', 0x7D : '、', 0x7E : '・',
     })
 
-class KATAKANA(Dictionary):
+class KATAKANA(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -39,7 +89,7 @@ class KATAKANA(Dictionary):
       0x70 : 'ヰ', 0x71 : 'ヱ', 0x72 : 'ヲ', 0x73 : 'ン', 0x74 : 'ヴ', 0x75 : 'ヵ', 0x76 : 'ヶ', 0x77 : 'ヽ', 0x78 : 'ヾ', 0x79 : 'ー', 0x7A : '。', 0x7B : '「', 0x7C : '」', 0x7D : '、', 0x7E : '・',
     })
 
-class ALNUM(Dictionary):
+class ALNUM(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -51,11 +101,11 @@ class ALNUM(Dictionary):
       0x70 : 'ｐ', 0x71 : 'ｑ', 0x72 : 'ｒ', 0x73 : 'ｓ', 0x74 : 'ｔ', 0x75 : 'ｕ', 0x76 : 'ｖ', 0x77 : 'ｗ', 0x78 : 'ｘ', 0x79 : 'ｙ', 0x7A : 'ｚ', 0x7B : '｛', 0x7C : '｜', 0x7D : '｝', 0x7E : '～',
     })
 
-class KANJI(Dictionary):
+class KANJI(CodeTable):
 
   def __init__(self):
     mapping = {}
-    symbols = ADDITIONAL_SYMBOLS()
+    symbols = table(ADDITIONAL_SYMBOLS)
     for ch1 in range(0x21, 0x75):
       for ch2 in range(0x21, 0x7F):
         key = (ch1 << 8) | ch2
@@ -72,7 +122,7 @@ class KANJI(Dictionary):
 
     super().__init__(2, mapping)
 
-class JIS_X0213_2004_KANJI_1(Dictionary):
+class JIS_X0213_2004_KANJI_1(CodeTable):
 
   def __init__(self):
     mapping = dict()
@@ -86,7 +136,7 @@ class JIS_X0213_2004_KANJI_1(Dictionary):
           mapping[(ch1 << 8) | ch2] = ''
     super().__init__(2, mapping)
 
-class JIS_X0213_2004_KANJI_2(Dictionary):
+class JIS_X0213_2004_KANJI_2(CodeTable):
 
   def __init__(self):
     mapping = dict()
@@ -100,7 +150,7 @@ class JIS_X0213_2004_KANJI_2(Dictionary):
           mapping[(ch1 << 8) | ch2] = ''
     super().__init__(2, mapping)
 
-class MACRO(Dictionary):
+class MACRO(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -122,7 +172,7 @@ class MACRO(Dictionary):
       0x6F: (   G_SET.ALNUM, G_SET.MOSAIC_A, G_DRCS.DRCS_1,  G_DRCS.MACRO),
     })
 
-class ADDITIONAL_SYMBOLS(Dictionary):
+class ADDITIONAL_SYMBOLS(CodeTable):
 
   def __init__(self):
     super().__init__(2, {
@@ -0,0 +1,33 @@
+from PIL import Image
+
+# (1 画素の bit 数, 最大の階調) 毎の、1 byte 分の画素を 0 - 255 の濃さに変換する表
+TABLES = dict()
+
+def depth_bits(depth):
+  # depth は階調数 - 2 (2 階調なら 1 bit, 3, 4 階調なら 2 bit)
+  return (depth + 1).bit_length()
+
+def pattern_length(width, height, depth):
+  return (width * height * depth_bits(depth) + 7) // 8
+
+def table(bits, maximum):
+  key = (bits, maximum)
+  if key not in TABLES:
+    mask = (1 << bits) - 1
+    TABLES[key] = tuple(
+      bytes(min(maximum, (byte >> (8 - bits * (index + 1))) & mask) * 255 // maximum for index in range(8 // bits))
+      for byte in range(256)
+    )
+  return TABLES[key]
+
+def decode(pattern, width, height, depth):
+  # 行の区切り無しに詰められた N bit の画素を、前景色の濃さを表す 'L' の画像にする
+  bits, maximum, count = depth_bits(depth), depth + 1, width * height
+  if 8 % bits == 0:
+    lookup = table(bits, maximum)
+    values = b''.join(lookup[byte] for byte in pattern)[:count]
+  else:
+    # 画素が byte をまたぐ場合はまとめて整数にして切り出す
+    value, total, mask = int.from_bytes(pattern, byteorder='big'), len(pattern) * 8, (1 << bits) - 1
+    values = bytes(min(maximum, (value >> (total - bits * (index + 1))) & mask) * 255 // maximum for index in range(min(count, total // bits)))
+  return Image.frombytes('L', (width, height), values.ljust(count, b'\x00'))
@@ -1,24 +1,28 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
 from mpeg2ts.pes import PES
 
 from subtitle.JIS8 import JIS8, CSI, ESC, G_SET, G_DRCS
 from subtitle.color import pallets
-from subtitle.dictionary import Dictionary, HIRAGANA, KATAKANA, ALNUM, KANJI, MACRO
+from subtitle.dictionary import Dictionary, HIRAGANA, KATAKANA, ALNUM, KANJI, MACRO, table
+from subtitle.cache import FONTS, GLYPHS
+from subtitle import drcs
 
 class NotImplementedYetError(Exception):
   pass
 
 class Renderer:
 
-  def __init__(self, pes):
+  def __init__(self, pes, fonts = FONTS, glyphs = GLYPHS):
     self.pes = pes
+    self.fonts = fonts
+    self.glyphs = glyphs
 
     self.G_TEXT = {
-      G_SET.KANJI: KANJI(),
-      G_SET.ALNUM: ALNUM(),
-      G_SET.HIRAGANA: HIRAGANA(),
-      G_SET.KATAKANA: KATAKANA(),
+      G_SET.KANJI: table(KANJI),
+      G_SET.ALNUM: table(ALNUM),
+      G_SET.HIRAGANA: table(HIRAGANA),
+      G_SET.KATAKANA: table(KATAKANA),
 
       #エラーがでたら対応する
       G_SET.MOSAIC_A: None, # MOSAIC A
@@ -53,7 +57,7 @@ class Renderer:
       G_DRCS.DRCS_13: Dictionary(1, {}), # DRCS 1byte
       G_DRCS.DRCS_14: Dictionary(1, {}), # DRCS 1byte
       G_DRCS.DRCS_15: Dictionary(1, {}), # DRCS 1byte
-      G_DRCS.MACRO: MACRO()
+      G_DRCS.MACRO: table(MACRO)
     }
     # (WARN: 本来は SWF は字幕管理データから取得する)
     self.swf, self.sdf, self.sdp = (960, 540), (960, 540), (0, 0)
@@ -184,16 +188,17 @@ class Renderer:
         fontId = (self.pes[begin + 0] & 0xF0) >> 4
         mode = self.pes[begin + 0] & 0x0F
         if mode == 0b0000 or mode == 0b0001 : #無圧縮の1bit(0000) or Nbit(0001) の DRCS
-          depth = self.pes[begin + 1]
+          depth = self.pes[begin + 1] # 階調数 - 2
           width = self.pes[begin + 2]
           height = self.pes[begin + 3]
-          depth_bits = len(bin(depth + 2)) - len(bin(depth + 2).rstrip('0'))
-          length = (width * height * depth_bits) // 8 # FIXME: depth = 階調数 - 2 なので対応する
+          length = drcs.pattern_length(width, height, depth)
+          # 描画の度に画素を読まないように、受け取った時点で濃さのマスク画像にしておく
+          pattern = drcs.decode(self.pes[begin + 4: begin + 4 + length], width, height, depth)
           if size == 1:
-            self.G_OTHER[0x40 + index][ch] = self.pes[begin + 4: begin + 4 + length]
+            self.G_OTHER[0x40 + index][ch] = pattern
             begin += 4 + length
           elif size == 2:
-            self.G_OTHER[0x40][ch] = self.pes[begin + 4: begin + 4 + length]
+            self.G_OTHER[0x40][ch] = pattern
             begin += 4 + length
           else:
             raise NotImplementedYetError()
@@ -533,10 +538,6 @@ class Renderer:
     width, height = self.kukaku()
     self.prepareImage()
 
-    fontImage = Image.new('RGBA', (self.ssm[0] + self.shs, self.ssm[1] + self.svs))
-    fontImageDraw = ImageDraw.Draw(fontImage)
-    drawFont = ImageFont.truetype('wlcmaru2004aribu.ttf', self.ssm[0])
-
     character_key = int.from_bytes(ch_byte, byteorder='big') & int.from_bytes(b'\x7F' * dict.size, byteorder='big')
     character = dict[character_key]
 
@@ -545,31 +546,32 @@ class Renderer:
       self.GL = 0
       self.GR = 2
       return
-    elif type(character) == bytearray: # DRCS
-      drcs = (int(self.ssm[0] * self.text_size[0]), int(self.ssm[1] * self.text_size[1]))
-      depth = len(character) * 8 // (drcs[0] * drcs[1])
-      fgImageDraw = ImageDraw.Draw(self.fgImage)
-      for y in range(drcs[1]):
-        for x in range(drcs[0]):
-          value = 0
-          for d in range(depth):
-            byte = (((y * drcs[0] + x) * depth) + d) // 8
-            index = 7 - ((((y * drcs[0] + x) * depth) + d) % 8)
-            value *= 2
-            value += (character[byte] & (1 << index)) >> index
-          if value != 0:
-            fgImageDraw.rectangle((
-              self.pos[0] -      0 + x + 0 + (int(self.shs * self.text_size[0]) // 2),
-              self.pos[1] - height + y + 0 + (int(self.svs * self.text_size[1]) // 2),
-              self.pos[0] -      0 + x + 1 + (int(self.shs * self.text_size[0]) // 2),
-              self.pos[1] - height + y + 1 + (int(self.svs * self.text_size[1]) // 2)),  fill=self.fg)
+    elif isinstance(character, Image.Image): # DRCS
+      size = (int(self.ssm[0] * self.text_size[0]), int(self.ssm[1] * self.text_size[1]))
+      mask = character if character.size == size else character.resize(size, Image.NEAREST)
+      # 階調を前景色の不透明度にした画像を重ねる (paste のマスクでは中間の階調が透明な黒と混ざって暗くなる)
+      glyph = Image.new('RGBA', size, self.fg)
+      glyph.putalpha(mask if self.fg[3] == 255 else mask.point(lambda value: value * self.fg[3] // 255))
+      self.fgImage.alpha_composite(glyph, (
+        self.pos[0] + (int(self.shs * self.text_size[0]) // 2),
+        self.pos[1] - height + (int(self.svs * self.text_size[1]) // 2),
+      ))
     else:
-      if self.orn:
-        for dy in range(-1, 2):
-          for dx in range(-1, 2):
-            fontImageDraw.text((self.shs // 2 + 2 * dx, self.svs // 2 + 2 * dy), character, font=drawFont, fill=self.orn)
-      fontImageDraw.text((self.shs // 2, self.svs // 2), character, font=drawFont, fill=self.fg)
-      self.fgImage.alpha_composite(fontImage.resize((width, height)), (self.pos[0], self.pos[1] - height))
+      # 同じ文字を同じ大きさと色で描くことが多いので、縮小まで済ませた画像を使い回す
+      key = (character, self.ssm, self.shs, self.svs, self.text_size, self.fg, self.orn, self.fonts.path)
+      glyph = self.glyphs.lookup(key)
+      if glyph is None:
+        fontImage = Image.new('RGBA', (self.ssm[0] + self.shs, self.ssm[1] + self.svs))
+        fontImageDraw = ImageDraw.Draw(fontImage)
+        drawFont = self.fonts.font(self.ssm[0])
+        if self.orn:
+          for dy in range(-1, 2):
+            for dx in range(-1, 2):
+              fontImageDraw.text((self.shs // 2 + 2 * dx, self.svs // 2 + 2 * dy), character, font=drawFont, fill=self.orn)
+        fontImageDraw.text((self.shs // 2, self.svs // 2), character, font=drawFont, fill=self.fg)
+        glyph = fontImage.resize((width, height))
+        self.glyphs.store(key, glyph)
+      self.fgImage.alpha_composite(glyph, (self.pos[0], self.pos[1] - height))
 
     fgImageDraw = ImageDraw.Draw(self.fgImage)
     if self.hlc & 0b0001 != 0:
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import tempfile
+import unittest
+
+from mpeg2ts.index import Index
+
+# arrival_time_stamp の先頭 byte が同期バイトと同じ値になっている 192 byte の M2TS のパケット
+TIMESTAMP = bytes([0x47, 0x02, 0x03, 0x04])
+PACKET = bytes([0x47, 0x01, 0x30, 0x10]) + bytes(range(184))
+
+class IndexPacketsTest(unittest.TestCase):
+
+  def packets(self, count, mmap):
+    index = Index(stride = 192, prefix = 4)
+    with tempfile.TemporaryFile() as file:
+      file.write((TIMESTAMP + PACKET) * count)
+      file.flush()
+      source = index.reader(file) if mmap else file
+      return [(bytes(ts.packet), ts.timestamp) for ts in index.packets(source, 0, (count - 1) * 192)]
+
+  def test_one_packet(self):
+    expected = [(PACKET, 0x07020304)]
+    self.assertEqual(self.packets(1, False), expected)
+    self.assertEqual(self.packets(1, True), expected)
+
+  def test_packets(self):
+    expected = [(PACKET, 0x07020304)] * 3
+    self.assertEqual(self.packets(3, False), expected)
+    self.assertEqual(self.packets(3, True), expected)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+from mpeg2ts.reader import Reader
+
+# arrival_time_stamp の先頭 byte が同期バイトと同じ値になっている 192 byte の M2TS のパケット
+TIMESTAMP = bytes([0x47, 0x02, 0x03, 0x04])
+PACKET = bytes([0x47, 0x01, 0x30, 0x10]) + bytes(range(184))
+
+class ReaderTest(unittest.TestCase):
+
+  def test_short_tail(self):
+    # EOF で 1 パケットも入らない 204 byte の間隔では同期させない
+    packets = list(Reader(io.BufferedReader(io.BytesIO(TIMESTAMP + PACKET))))
+    self.assertEqual([bytes(ts.packet) for ts in packets], [PACKET])
+
+if __name__ == "__main__":
+  unittest.main()